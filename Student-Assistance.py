@@ -5,118 +5,979 @@
 # Data is stored locally in SQLite: student_app.db
 
 import sqlite3
-from contextlib import closing
+from contextlib import closing, contextmanager
 from pathlib import Path
 import hashlib
 import secrets
 import datetime as dt
-
+import os
+import queue
+import threading
+import atexit
+import time
+import sys
+import argparse
+import tempfile
+import hmac
+import re
+import statistics
+import heapq
+import itertools
+import json
+import math
+import csv
+import io
+import html
+from collections import deque
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+import mimetypes
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pandas as pd
 import streamlit as st
-from fpdf import FPDF
+
+from pdf_export import PdfRenderCache, export_notes_job, read_progress, write_progress
+import analytics
 
 DB_PATH = Path("student_app.db")
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+# Attachments are stored once per distinct content, named by their sha256.
+BLOB_DIR = UPLOAD_DIR / "blobs"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Connection pool sizing; overridable per deployment through the environment.
+POOL_SIZE = int(os.environ.get("STUDENT_APP_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("STUDENT_APP_POOL_TIMEOUT", "10"))
+
+# Storage profiles: PRAGMAs applied to every pooled connection. "wal" lets readers
+# proceed while a writer commits and takes the write lock up front (BEGIN IMMEDIATE)
+# so concurrent writers queue on busy_timeout instead of failing with "database is locked".
+# "timeout" is the sqlite3.connect() busy wait in seconds; legacy uses SQLite's own default
+# of not waiting at all, so contention shows up as immediate "database is locked" errors.
+STORAGE_PROFILES = {
+    "legacy": {
+        "pragmas": {},
+        "isolation_level": "",
+        "timeout": 0,
+        "checkpoint_seconds": 0,
+    },
+    "wal": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -8000,
+            "mmap_size": 64 * 1024 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+        },
+        "isolation_level": "IMMEDIATE",
+        "timeout": 5.0,
+        "checkpoint_seconds": 300,
+    },
+    "wal-durable": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "FULL",
+            "cache_size": -8000,
+            "mmap_size": 64 * 1024 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 10000,
+        },
+        "isolation_level": "IMMEDIATE",
+        "timeout": 10.0,
+        "checkpoint_seconds": 60,
+    },
+}
+STORAGE_PROFILE = os.environ.get("STUDENT_APP_STORAGE_PROFILE", "wal")
+
+# Password hashing cost. Use `calibrate-kdf` to pick values for the deployment's hardware;
+# stored hashes with other parameters are upgraded transparently at the next login.
+PASSWORD_KDF = os.environ.get("STUDENT_APP_KDF", "scrypt")
+KDF_PARAMS = {
+    "scrypt": {
+        "n": int(os.environ.get("STUDENT_APP_SCRYPT_N", "16384")),
+        "r": int(os.environ.get("STUDENT_APP_SCRYPT_R", "8")),
+        "p": int(os.environ.get("STUDENT_APP_SCRYPT_P", "1")),
+    },
+    "pbkdf2_sha256": {
+        "i": int(os.environ.get("STUDENT_APP_PBKDF2_ITERATIONS", "600000")),
+    },
+}
+AUTH_WORKERS = int(os.environ.get("STUDENT_APP_AUTH_WORKERS", "4"))
+
+# Login sessions: sliding expiry, and how long a validated token is trusted from memory
+# before the database is consulted again (which also extends the expiry).
+SESSION_TTL_SECONDS = int(os.environ.get("STUDENT_APP_SESSION_TTL_HOURS", "168")) * 3600
+SESSION_RECHECK_SECONDS = int(os.environ.get("STUDENT_APP_SESSION_RECHECK_SECONDS", "60"))
+SESSION_CACHE_SIZE = int(os.environ.get("STUDENT_APP_SESSION_CACHE_SIZE", "4096"))
+# The login token is kept in this first-party cookie, never in a URL.
+SESSION_COOKIE = "student_session"
+# Download links carry their own signed token for one file, valid for one to two of these.
+DOWNLOAD_LINK_TTL_SECONDS = int(os.environ.get("STUDENT_APP_DOWNLOAD_LINK_TTL", "900"))
+
+NOTES_PAGE_SIZE = int(os.environ.get("STUDENT_APP_NOTES_PAGE_SIZE", "20"))
+# Bulk imports run in one transaction, handed to executemany this many rows at a time.
+BULK_CHUNK_SIZE = int(os.environ.get("STUDENT_APP_BULK_CHUNK_SIZE", "1000"))
+
+# Side-car HTTP server for downloads: streams files with sendfile and supports Range/ETag,
+# which st.download_button cannot do. Set the port to 0 to fall back to download buttons.
+FILE_SERVER_HOST = os.environ.get("STUDENT_APP_FILE_SERVER_HOST", "127.0.0.1")
+FILE_SERVER_PORT = int(os.environ.get("STUDENT_APP_FILE_SERVER_PORT", "8502"))
+# Reminder delivery: "queue" shows in-app toasts (a stand-in for push/email),
+# "file" appends JSON lines to REMINDER_LOG.
+REMINDER_NOTIFIER = os.environ.get("STUDENT_APP_NOTIFIER", "queue")
+REMINDER_LOG = Path(os.environ.get("STUDENT_APP_REMINDER_LOG", "reminders.log"))
+# Only reminders still ahead are scheduled; one that comes up this long after its task
+# was due (e.g. the host was asleep) is dropped rather than delivered.
+REMINDER_GRACE_SECONDS = 300
+
+# Bulk PDF exports render in worker processes and are kept on disk for a day.
+EXPORT_DIR = Path("exports")
+EXPORT_WORKERS = int(os.environ.get("STUDENT_APP_EXPORT_WORKERS", "2"))
+EXPORT_TTL_SECONDS = 24 * 3600
+# Job states that will not change any more; the Exports page stops polling once all are.
+EXPORT_SETTLED_STATES = ("done", "error", "expired")
+# Single-note PDFs are cached on disk, keyed by content, and evicted least-recently-used.
+PDF_CACHE_DIR = EXPORT_DIR / "cache"
+PDF_CACHE_MAX_BYTES = int(os.environ.get("STUDENT_APP_PDF_CACHE_MB", "200")) * 1024 * 1024
+
+FILE_SERVER_URL = os.environ.get("STUDENT_APP_FILE_SERVER_URL", f"http://localhost:{FILE_SERVER_PORT}")
 
 # --------------------------- UTILITIES ---------------------------
 
-def hash_password(password: str, salt: str) -> str:
-    return hashlib.sha256((salt + password).encode()).hexdigest()
-
-def init_db():
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                salt TEXT NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            );
+# Hot per-user list queries, shared with check_query_plans() so the plan check
+# always inspects exactly what the pages run.
+# Notes page listing: no content column, keyset-paginated on (updated_at, id).
+SQL_LIST_NOTE_HEADERS = "SELECT id, title, attachment, attachment_name, created_at, updated_at FROM notes WHERE user_id=? ORDER BY updated_at DESC, id DESC LIMIT ?"
+SQL_LIST_NOTE_HEADERS_AFTER = "SELECT id, title, attachment, attachment_name, created_at, updated_at FROM notes WHERE user_id=? AND (updated_at, id) < (?, ?) ORDER BY updated_at DESC, id DESC LIMIT ?"
+# Full-text search: ranked by bm25 with titles weighted above bodies.
+SQL_SEARCH_NOTES = """
+    SELECT n.id, n.title, n.attachment, n.attachment_name, n.created_at, n.updated_at,
+           snippet(notes_fts, 1, '**', '**', ' … ', 12)
+    FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+    WHERE notes_fts MATCH ? AND n.user_id = ?
+    ORDER BY bm25(notes_fts, 5.0, 1.0)
+    LIMIT ?
+"""
+SQL_LIST_TASKS = "SELECT id, task, due_date, remind_before_hours, done, created_at, updated_at FROM tasks WHERE user_id=? ORDER BY done, due_at, updated_at DESC"
+SQL_UPCOMING_REMINDERS = "SELECT task, due_at, remind_at FROM tasks WHERE user_id=? AND done = 0 AND remind_at > ? AND remind_at < ? ORDER BY remind_at"
+SQL_PENDING_REMINDERS = (
+    "SELECT id, remind_at FROM tasks "
+    "WHERE done = 0 AND reminded_at IS NULL AND remind_at IS NOT NULL AND remind_at > ? ORDER BY remind_at"
+)
+SQL_LIST_GOALS = "SELECT id, goal, target_value, progress FROM goals WHERE user_id=? ORDER BY updated_at DESC"
+SQL_LIST_FLASHCARDS = "SELECT id, question, answer FROM flashcards WHERE user_id=? ORDER BY id DESC LIMIT ?"
+SQL_DUE_FLASHCARDS = (
+    "SELECT id, question, answer, ease, interval_days, reps, lapses FROM flashcards "
+    "WHERE user_id=? AND due_at <= ? ORDER BY due_at LIMIT ?"
+)
+SQL_NEXT_DUE_FLASHCARD = "SELECT MIN(due_at) FROM flashcards WHERE user_id=?"
+SQL_FLASHCARD_EXISTS = "SELECT 1 FROM flashcards WHERE user_id=? AND question_hash=?"
+SQL_LIST_QUIZZES = (
+    "SELECT id, title, created_at, (SELECT COUNT(*) FROM quiz_questions WHERE quiz_id = quizzes.id) "
+    "FROM quizzes WHERE user_id=? ORDER BY id DESC"
+)
+SQL_QUIZ_QUESTIONS = (
+    "SELECT q.id, q.prompt, q.topic, c.id, c.text, c.is_correct FROM quiz_questions q "
+    "JOIN quiz_choices c ON c.question_id = q.id WHERE q.quiz_id=? ORDER BY q.position, q.id, c.position"
+)
+SQL_LAST_ATTEMPT = "SELECT MAX(id) FROM quiz_attempts WHERE user_id=?"
+SQL_NOTE_TERM_WEIGHTS = (
+    "SELECT nt.term, nt.tf, ct.df FROM note_terms nt "
+    "JOIN corpus_terms ct ON ct.user_id = nt.user_id AND ct.term = nt.term WHERE nt.note_id=?"
+)
+SQL_COUNT_NOTES = "SELECT COUNT(*) FROM notes WHERE user_id=?"
+# Not in HOT_QUERIES: grouping the joined postings always needs a temp b-tree, but both
+# sides of the join are index lookups.
+SQL_RELATED_NOTES = (
+    "SELECT other.note_id, n.title FROM note_terms own "
+    "JOIN note_terms other ON other.user_id = own.user_id AND other.term = own.term AND other.note_id != own.note_id "
+    "JOIN notes n ON n.id = other.note_id "
+    "WHERE own.note_id=? GROUP BY other.note_id ORDER BY COUNT(*) DESC LIMIT ?"
+)
+SQL_LIST_ATTEMPTS = (
+    "SELECT id, started_at, finished_at, score, total FROM quiz_attempts "
+    "WHERE user_id=? AND quiz_id=? ORDER BY id DESC LIMIT ?"
+)
+SQL_FEED_VERSION = "SELECT MAX(updated_at), COUNT(*) FROM tasks WHERE user_id=?"
+SQL_FEED_DELETED = "SELECT tasks_deleted_at FROM users WHERE id=?"
+SQL_GET_TIMETABLE = "SELECT day, slot, subject FROM timetable WHERE user_id=?"
+
+HOT_QUERIES = {
+    "list_note_headers": SQL_LIST_NOTE_HEADERS,
+    "list_note_headers_after": SQL_LIST_NOTE_HEADERS_AFTER,
+    "list_tasks": SQL_LIST_TASKS,
+    "upcoming_reminders": SQL_UPCOMING_REMINDERS,
+    "pending_reminders": SQL_PENDING_REMINDERS,
+    "list_goals": SQL_LIST_GOALS,
+    "list_flashcards": SQL_LIST_FLASHCARDS,
+    "flashcard_exists": SQL_FLASHCARD_EXISTS,
+    "due_flashcards": SQL_DUE_FLASHCARDS,
+    "next_due_flashcard": SQL_NEXT_DUE_FLASHCARD,
+    "list_quizzes": SQL_LIST_QUIZZES,
+    "quiz_questions": SQL_QUIZ_QUESTIONS,
+    "list_attempts": SQL_LIST_ATTEMPTS,
+    "last_attempt": SQL_LAST_ATTEMPT,
+    "attempt_answers": analytics.SQL_ATTEMPT_ANSWERS,
+    "goal_last_event": analytics.SQL_GOAL_LAST_EVENT,
+    "goal_span": analytics.SQL_GOAL_SPAN,
+    "note_term_weights": SQL_NOTE_TERM_WEIGHTS,
+    "count_notes": SQL_COUNT_NOTES,
+    "get_timetable": SQL_GET_TIMETABLE,
+    "calendar_feed_version": SQL_FEED_VERSION,
+    "calendar_feed_deleted": SQL_FEED_DELETED,
+}
+
+def apply_storage_profile(conn: sqlite3.Connection, profile: dict):
+    for pragma, value in profile["pragmas"].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+def _migration_baseline(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            salt TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            attachment TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            task TEXT NOT NULL,
+            due_date TEXT,
+            remind_before_hours INTEGER DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS flashcards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quizzes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            questions TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS goals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            goal TEXT NOT NULL,
+            target_value INTEGER NOT NULL,
+            progress INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS timetable (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        day TEXT,
+        slot TEXT,
+        subject TEXT
+        );
+    """)
+
+def _migration_list_indexes(conn: sqlite3.Connection):
+    # Composite indexes matching the WHERE/ORDER BY of the per-user list queries.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_user_updated ON notes(user_id, updated_at)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_order "
+        "ON tasks(user_id, done, COALESCE(due_date,''), updated_at DESC)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_goals_user_updated ON goals(user_id, updated_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_user ON flashcards(user_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quizzes_user ON quizzes(user_id, id)")
+
+def _migration_timetable_unique(conn: sqlite3.Connection):
+    # save_timetable upserts ON CONFLICT(user_id, day, slot), which needs a unique index.
+    # Older databases may hold duplicate slots; keep the newest row of each.
+    run_in_batches(conn, "timetable", """
+        DELETE FROM timetable
+        WHERE id > ? AND id <= ?
+          AND id NOT IN (SELECT MAX(id) FROM timetable GROUP BY user_id, day, slot)
+    """)
+    with transaction(conn):
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_timetable_slot ON timetable(user_id, day, slot)")
+
+def _migration_sessions(conn: sqlite3.Connection):
+    # Only a sha256 of each token is stored, so a leaked database cannot be replayed.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        expires_at INTEGER NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+
+def _migration_notes_keyset_index(conn: sqlite3.Connection):
+    # Adds id as the keyset tie-breaker for notes pagination; supersedes the v2 index.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_user_updated_id ON notes(user_id, updated_at, id)")
+    conn.execute("DROP INDEX IF EXISTS idx_notes_user_updated")
+
+def _migration_notes_fts(conn: sqlite3.Connection):
+    # External-content FTS5 index over notes, kept in sync by triggers. The prefix
+    # index makes "word*" queries a direct lookup rather than a term-list scan.
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='notes_fts'").fetchone()
+    if exists:
+        # Re-run after an interrupted backfill: the triggers are in place, so rebuild.
+        with transaction(conn):
+            conn.execute("INSERT INTO notes_fts(notes_fts) VALUES('rebuild')")
+        return
+    with transaction(conn):
+        conn.execute("""
+        CREATE VIRTUAL TABLE notes_fts USING fts5(
+            title, content,
+            content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        );
         """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                attachment TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            );
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END;
         """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                task TEXT NOT NULL,
-                due_date TEXT,
-                remind_before_hours INTEGER DEFAULT 0,
-                done INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            );
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        END;
         """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS flashcards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                question TEXT NOT NULL,
-                answer TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            );
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END;
         """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS quizzes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+        # Rows written after this point are indexed by the triggers.
+        top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0]
+    run_in_batches(conn, "notes", """
+        INSERT INTO notes_fts(rowid, title, content)
+        SELECT id, title, content FROM notes WHERE id > ? AND id <= ?
+    """, top=top)
+
+def rebuild_notes_fts(db_path: Path = DB_PATH):
+    with closing(sqlite3.connect(db_path, isolation_level=None)) as conn:
+        with transaction(conn):
+            conn.execute("INSERT INTO notes_fts(notes_fts) VALUES('rebuild')")
+        conn.execute("INSERT INTO notes_fts(notes_fts) VALUES('optimize')")
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, decl: str):
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def _migration_attachment_blobs(conn: sqlite3.Connection):
+    # One row per stored blob; refcount is the number of notes pointing at it.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS attachments (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    );
+    """)
+    _add_column(conn, "notes", "attachment_name", "TEXT")
+
+def _migration_calendar_feeds(conn: sqlite3.Connection):
+    # One subscription token per user (stored hashed, like sessions); the tasks index
+    # makes the feed's MAX(updated_at) freshness check an index-only lookup.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS calendar_feeds (
+        token_hash TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL UNIQUE,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_updated ON tasks(user_id, updated_at)")
+
+def _migration_reminder_delivery(conn: sqlite3.Connection):
+    # reminded_at marks delivered reminders; the partial index holds only tasks still
+    # waiting for one, so the scheduler's startup load never touches finished work.
+    _add_column(conn, "tasks", "reminded_at", "TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tasks_pending_reminder ON tasks(due_date) "
+        "WHERE done = 0 AND reminded_at IS NULL AND due_date IS NOT NULL"
+    )
+
+def _iso_to_epoch(value: str | None) -> int | None:
+    try:
+        return int(dt.datetime.fromisoformat(value).timestamp()) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _migration_task_epochs(conn: sqlite3.Connection):
+    # Normalised UTC epoch columns, so sorting and the reminder window are plain
+    # integer range scans instead of per-row ISO parsing in Python. Rows whose
+    # due_date does not parse keep NULLs and simply never get a reminder.
+    with transaction(conn):
+        _add_column(conn, "tasks", "due_at", "INTEGER")
+        _add_column(conn, "tasks", "remind_at", "INTEGER")
+    conn.create_function("iso_to_epoch", 1, _iso_to_epoch, deterministic=True)
+    run_in_batches(conn, "tasks", """
+        UPDATE tasks
+        SET due_at = iso_to_epoch(due_date),
+            remind_at = iso_to_epoch(due_date) - COALESCE(remind_before_hours, 0) * 3600
+        WHERE id > ? AND id <= ? AND due_date IS NOT NULL AND due_at IS NULL
+    """)
+    with transaction(conn):
+        conn.execute("DROP INDEX IF EXISTS idx_tasks_user_order")
+        conn.execute("DROP INDEX IF EXISTS idx_tasks_pending_reminder")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks(user_id, done, due_at, updated_at DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_remind ON tasks(user_id, done, remind_at)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_pending_remind_at ON tasks(remind_at) "
+            "WHERE done = 0 AND reminded_at IS NULL AND remind_at IS NOT NULL"
+        )
+
+def _migration_flashcard_hash(conn: sqlite3.Connection):
+    # Imports dedupe on (user_id, question_hash): a fixed-width key is cheaper to index
+    # than arbitrarily long question text. Not UNIQUE, since older data may hold repeats.
+    with transaction(conn):
+        _add_column(conn, "flashcards", "question_hash", "TEXT")
+    conn.create_function("question_hash", 1, question_hash, deterministic=True)
+    run_in_batches(conn, "flashcards", """
+        UPDATE flashcards SET question_hash = question_hash(question)
+        WHERE id > ? AND id <= ? AND question_hash IS NULL
+    """)
+    with transaction(conn):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_user_qhash ON flashcards(user_id, question_hash)")
+
+def _migration_spaced_repetition(conn: sqlite3.Connection):
+    # Scheduling state lives on the card. Constant defaults make ADD COLUMN a schema-only
+    # change, and due_at = 0 puts every existing card in the first review session.
+    _add_column(conn, "flashcards", "ease", "REAL NOT NULL DEFAULT 2.5")
+    _add_column(conn, "flashcards", "interval_days", "REAL NOT NULL DEFAULT 0")
+    _add_column(conn, "flashcards", "reps", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "flashcards", "lapses", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "flashcards", "due_at", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_user_due ON flashcards(user_id, due_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS flashcard_reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            grade INTEGER NOT NULL,
+            interval_days REAL NOT NULL,
+            reviewed_at INTEGER NOT NULL,
+            FOREIGN KEY(card_id) REFERENCES flashcards(id) ON DELETE CASCADE,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+
+def _migration_structured_quizzes(conn: sqlite3.Connection):
+    # One row per question and per choice, parsed once when the quiz is saved.
+    # quizzes.questions keeps the source text the quiz was written in.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            prompt TEXT NOT NULL,
+            topic TEXT,
+            FOREIGN KEY(quiz_id) REFERENCES quizzes(id) ON DELETE CASCADE
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_choices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            is_correct INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(question_id) REFERENCES quiz_questions(id) ON DELETE CASCADE
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            FOREIGN KEY(quiz_id) REFERENCES quizzes(id) ON DELETE CASCADE,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attempt_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            choice_id INTEGER,
+            is_correct INTEGER NOT NULL,
+            elapsed_ms INTEGER NOT NULL,
+            FOREIGN KEY(attempt_id) REFERENCES quiz_attempts(id) ON DELETE CASCADE,
+            FOREIGN KEY(question_id) REFERENCES quiz_questions(id) ON DELETE CASCADE
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_questions_quiz ON quiz_questions(quiz_id, position)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_choices_question ON quiz_choices(question_id, position)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_quiz ON quiz_attempts(user_id, quiz_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_answers_attempt ON quiz_answers(attempt_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_answers_question ON quiz_answers(question_id)")
+    # Legacy blobs that parse become structured quizzes; the rest stay viewable as text.
+    for quiz_id, source in conn.execute("SELECT id, questions FROM quizzes").fetchall():
+        try:
+            _insert_quiz_questions(conn, quiz_id, parse_quiz(source))
+        except ValueError:
+            pass
+
+def _migration_note_terms(conn: sqlite3.Connection):
+    # Per-note term frequencies and per-user document frequencies for keyword extraction.
+    # The note functions keep both current, so quiz generation never rescans the corpus.
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS note_terms (
+                note_id INTEGER NOT NULL,
+                term TEXT NOT NULL,
                 user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                questions TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            );
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (note_id, term)
+            ) WITHOUT ROWID;
         """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS goals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_terms (
                 user_id INTEGER NOT NULL,
-                goal TEXT NOT NULL,
-                target_value INTEGER NOT NULL,
-                progress INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            );
+                term TEXT NOT NULL,
+                df INTEGER NOT NULL,
+                PRIMARY KEY (user_id, term)
+            ) WITHOUT ROWID;
         """)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS timetable (
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_note_terms_user_term ON note_terms(user_id, term)")
+    top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0]
+    for low in range(0, top, MIGRATION_BATCH_SIZE):
+        with transaction(conn):
+            rows = conn.execute(
+                "SELECT id, user_id, title, content FROM notes WHERE id > ? AND id <= ? "
+                "AND id NOT IN (SELECT note_id FROM note_terms)",
+                (low, low + MIGRATION_BATCH_SIZE),
+            ).fetchall()
+            for note_id, user_id, title, content in rows:
+                _index_note_terms(conn, user_id, note_id, title, content)
+
+def _migration_attempts_user_index(conn: sqlite3.Connection):
+    # Newest attempt per user in one index probe; it versions the analytics cache.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user ON quiz_attempts(user_id, id)")
+
+def _utc_iso_to_epoch(value: str | None) -> int | None:
+    # created_at/updated_at columns hold naive UTC from datetime.utcnow().
+    try:
+        return int(dt.datetime.fromisoformat(value).replace(tzinfo=dt.timezone.utc).timestamp()) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _migration_goal_events(conn: sqlite3.Connection):
+    # Append-only progress log; goals.progress stays as the current value for cheap lists.
+    # Existing goals get their creation (at 0) and their last recorded value as history.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS goal_events (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            day TEXT,
-            slot TEXT,
-            subject TEXT
+            goal_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            progress INTEGER NOT NULL,
+            FOREIGN KEY(goal_id) REFERENCES goals(id) ON DELETE CASCADE
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_goal_events_goal_ts ON goal_events(goal_id, ts)")
+    conn.create_function("utc_iso_to_epoch", 1, _utc_iso_to_epoch, deterministic=True)
+    conn.execute("""
+        INSERT INTO goal_events (goal_id, ts, progress)
+        SELECT id, COALESCE(utc_iso_to_epoch(created_at), 0), 0 FROM goals
+    """)
+    conn.execute("""
+        INSERT INTO goal_events (goal_id, ts, progress)
+        SELECT id, COALESCE(utc_iso_to_epoch(updated_at), 0), progress FROM goals WHERE progress != 0
+    """)
+
+def _migration_task_deletions(conn: sqlite3.Connection):
+    # A deleted task leaves no updated_at behind, so the calendar feed's Last-Modified
+    # also takes the time of the user's latest task deletion.
+    _add_column(conn, "users", "tasks_deleted_at", "TEXT")
+
+def _migration_app_secrets(conn: sqlite3.Connection):
+    # Process-independent secrets: every app process and `serve-files` verify download
+    # links with the same key because it lives in the database they share.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_secrets (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """)
+    conn.execute("INSERT OR IGNORE INTO app_secrets (name, value) VALUES ('download_key', ?)",
+                 (secrets.token_hex(32),))
+
+# (version, name, function, online). Offline migrations run inside one transaction
+# together with their version bump. Online migrations commit in batches so other
+# sessions can write in between, and must therefore be safe to re-run.
+MIGRATIONS = [
+    (1, "baseline tables", _migration_baseline, False),
+    (2, "per-user list indexes", _migration_list_indexes, False),
+    (3, "unique timetable slots", _migration_timetable_unique, True),
+    (4, "login sessions", _migration_sessions, False),
+    (5, "notes keyset pagination index", _migration_notes_keyset_index, False),
+    (6, "notes full-text index", _migration_notes_fts, True),
+    (7, "content-addressed attachments", _migration_attachment_blobs, False),
+    (8, "calendar feeds", _migration_calendar_feeds, False),
+    (9, "reminder delivery tracking", _migration_reminder_delivery, False),
+    (10, "task due/remind epoch columns", _migration_task_epochs, True),
+    (11, "flashcard question hashes", _migration_flashcard_hash, True),
+    (12, "spaced repetition scheduling", _migration_spaced_repetition, False),
+    (13, "structured quizzes", _migration_structured_quizzes, False),
+    (14, "note term statistics", _migration_note_terms, True),
+    (15, "quiz attempts by user", _migration_attempts_user_index, False),
+    (16, "goal progress history", _migration_goal_events, False),
+    (17, "download link signing key", _migration_app_secrets, False),
+    (18, "task deletion times", _migration_task_deletions, False),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+MIGRATION_BATCH_SIZE = 5000
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def run_in_batches(conn: sqlite3.Connection, table: str, sql: str, batch_size: int = MIGRATION_BATCH_SIZE,
+                   top: int | None = None):
+    # sql takes (low, high] id bounds; each slice is its own short write transaction.
+    if top is None:
+        top = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    low = 0
+    while low < top:
+        with transaction(conn):
+            conn.execute(sql, (low, low + batch_size))
+        low += batch_size
+
+def connect_readonly(db_path: Path) -> sqlite3.Connection:
+    # For commands that only inspect a database: never creates the file or writes to it.
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    # Read-only, so it also works on connect_readonly() connections.
+    recorded = 0
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'").fetchone():
+        recorded = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+    # Databases bootstrapped before schema_version existed only carry PRAGMA user_version.
+    return max(recorded, conn.execute("PRAGMA user_version").fetchone()[0])
+
+def pending_migrations(db_path: Path = DB_PATH) -> list[tuple]:
+    # What migrate() would apply, worked out without touching the database.
+    if not Path(db_path).exists():
+        return list(MIGRATIONS)
+    with closing(connect_readonly(db_path)) as conn:
+        current = _schema_version(conn)
+    return [m for m in MIGRATIONS if m[0] > current]
+
+def _record_migration(conn: sqlite3.Connection, version: int, name: str):
+    conn.execute(
+        "INSERT OR REPLACE INTO schema_version (version, name, applied_at) VALUES (?,?,?)",
+        (version, name, dt.datetime.utcnow().isoformat()),
+    )
+    conn.execute(f"PRAGMA user_version = {version}")
+
+def migrate(db_path: Path = DB_PATH, dry_run: bool = False) -> list[tuple[int, str]]:
+    if dry_run:
+        return [(version, name) for version, name, _fn, _online in pending_migrations(db_path)]
+    with closing(sqlite3.connect(db_path, isolation_level=None)) as conn:
+        apply_storage_profile(conn, STORAGE_PROFILES[STORAGE_PROFILE])
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return []
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
             );
         """)
-        conn.commit()
+        pending = [m for m in MIGRATIONS if m[0] > _schema_version(conn)]
+        applied = []
+        for version, name, fn, online in pending:
+            if online:
+                fn(conn)
+                with transaction(conn):
+                    _record_migration(conn, version, name)
+            else:
+                with transaction(conn):
+                    # Another process may have applied it while we waited for the lock.
+                    if _schema_version(conn) >= version:
+                        continue
+                    fn(conn)
+                    _record_migration(conn, version, name)
+            applied.append((version, name))
+        return applied
+
+def init_db(db_path: Path = DB_PATH):
+    migrate(db_path)
+
+def check_query_plans(conn: sqlite3.Connection) -> list[str]:
+    # A hot query that scans a table or sorts through a temp b-tree is missing an index.
+    problems = []
+    for name, sql in HOT_QUERIES.items():
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (0,) * sql.count("?")):
+            detail = row[3]
+            if detail.startswith("SCAN") or "TEMP B-TREE" in detail:
+                problems.append(f"{name}: {detail}")
+    return problems
+
+@st.cache_resource
+def bootstrap_db() -> int:
+    # Runs the migration check once per process, not on every Streamlit rerun.
+    init_db()
+    return SCHEMA_VERSION
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections shared by all sessions."""
+
+    def __init__(self, db_path: Path, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 profile: str = STORAGE_PROFILE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.profile = STORAGE_PROFILES[profile]
+        self._last_checkpoint = time.monotonic()
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.profile["timeout"],
+                               isolation_level=self.profile["isolation_level"])
+        apply_storage_profile(conn, self.profile)
+        return conn
+
+    def _maybe_checkpoint(self, conn: sqlite3.Connection):
+        interval = self.profile["checkpoint_seconds"]
+        if not interval or time.monotonic() - self._last_checkpoint < interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_checkpoint < interval:
+                return
+            self._last_checkpoint = time.monotonic()
+        try:
+            # PASSIVE never blocks readers or writers; it copies what it can.
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self) -> sqlite3.Connection:
+        while True:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed.")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No database connection free after {self.timeout}s.")
+            if self._healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn: sqlite3.Connection):
+        # Uncommitted work is dropped, exactly like closing a one-shot connection did.
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._maybe_checkpoint(conn)
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._created, "idle": self._idle.qsize()}
+
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    # Cached at process level so every rerun and every browser session shares it.
+    pool = ConnectionPool(DB_PATH)
+    atexit.register(pool.close)
+    return pool
 
 def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    return get_pool().connection()
+
+def insert_many(conn: sqlite3.Connection, sql: str, rows, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    # Only one chunk of a (possibly lazy) row iterable is materialised at a time. The
+    # caller commits once at the end, so a failure part-way leaves nothing behind.
+    # Returns the number of rows actually written, which is less than the input for
+    # conditional inserts.
+    rows = iter(rows)
+    count = 0
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        count += conn.executemany(sql, chunk).rowcount
+    return count
 
 # --------------------------- AUTH ---------------------------
 
+def _kdf_digest(kdf: str, params: dict, password: str, salt: str) -> bytes:
+    if kdf == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + 2 ** 20, dklen=32)
+    if kdf == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), params["i"])
+    raise ValueError(f"Unknown password KDF: {kdf}")
+
+def hash_password(password: str, salt: str, kdf: str = PASSWORD_KDF, params: dict | None = None) -> str:
+    # Encoded as "<kdf>$<k=v,...>$<hex digest>" so each row carries its own cost parameters.
+    params = params or KDF_PARAMS[kdf]
+    digest = _kdf_digest(kdf, params, password, salt)
+    encoded = ",".join(f"{k}={v}" for k, v in params.items())
+    return f"{kdf}${encoded}${digest.hex()}"
+
+def _parse_password_hash(stored: str) -> tuple[str, dict, str]:
+    if "$" not in stored:
+        # Rows created before KDF support: bare sha256(salt + password).
+        return "sha256", {}, stored
+    kdf, encoded, digest = stored.split("$")
+    params = {k: int(v) for k, v in (item.split("=") for item in encoded.split(","))}
+    return kdf, params, digest
+
+def verify_password(password: str, salt: str, stored: str) -> bool:
+    kdf, params, expected = _parse_password_hash(stored)
+    if kdf == "sha256":
+        candidate = hashlib.sha256((salt + password).encode()).hexdigest()
+    else:
+        candidate = _kdf_digest(kdf, params, password, salt).hex()
+    return hmac.compare_digest(candidate, expected)
+
+def needs_rehash(stored: str) -> bool:
+    kdf, params, _ = _parse_password_hash(stored)
+    return kdf != PASSWORD_KDF or params != KDF_PARAMS[PASSWORD_KDF]
+
+@st.cache_resource
+def get_auth_executor() -> ThreadPoolExecutor:
+    # Bounds how many expensive hashes run at once across all sessions, so a burst of
+    # logins cannot exhaust CPU or scrypt memory for everyone else.
+    executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+    atexit.register(executor.shutdown, wait=False)
+    return executor
+
+def calibrate_kdf(kdf: str, target_ms: float) -> tuple[dict, float]:
+    def timed(params):
+        start = time.perf_counter()
+        _kdf_digest(kdf, params, "calibration-password", secrets.token_hex(16))
+        return (time.perf_counter() - start) * 1000
+    if kdf == "scrypt":
+        params = dict(KDF_PARAMS["scrypt"], n=2 ** 12)
+        elapsed = timed(params)
+        while elapsed < target_ms and params["n"] < 2 ** 20:
+            params["n"] *= 2
+            elapsed = timed(params)
+        return params, elapsed
+    # PBKDF2 cost is linear in the iteration count, so one probe is enough to scale.
+    probe = {"i": 100_000}
+    iterations = max(10_000, int(probe["i"] * target_ms / timed(probe)))
+    params = {"i": iterations}
+    return params, timed(params)
+
 def create_user(username: str, password: str) -> tuple[bool, str]:
     username = username.strip().lower()
     if not username or not password:
         return False, "Username and password required."
     salt = secrets.token_hex(16)
-    pwd_hash = hash_password(password, salt)
+    pwd_hash = get_auth_executor().submit(hash_password, password, salt).result()
     now = dt.datetime.utcnow().isoformat()
     try:
-        with closing(get_conn()) as conn:
+        with get_conn() as conn:
             cur = conn.cursor()
             cur.execute(
                 "INSERT INTO users (username, salt, password_hash, created_at) VALUES (?,?,?,?)",
@@ -129,208 +990,1411 @@ def create_user(username: str, password: str) -> tuple[bool, str]:
 
 def authenticate(username: str, password: str):
     username = username.strip().lower()
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute("SELECT id, salt, password_hash FROM users WHERE username=?", (username,))
         row = cur.fetchone()
-        if not row:
-            return None
-        uid, salt, ph = row
-        if hash_password(password, salt) == ph:
-            return uid
-    return None
+    executor = get_auth_executor()
+    if not row:
+        # Hash anyway so unknown usernames cost the same time as wrong passwords.
+        executor.submit(hash_password, password, secrets.token_hex(16)).result()
+        return None
+    uid, salt, ph = row
+    if not executor.submit(verify_password, password, salt, ph).result():
+        return None
+    if needs_rehash(ph):
+        new_salt = secrets.token_hex(16)
+        new_hash = executor.submit(hash_password, password, new_salt).result()
+        with get_conn() as conn:
+            conn.execute(
+                "UPDATE users SET salt=?, password_hash=? WHERE id=? AND password_hash=?",
+                (new_salt, new_hash, uid, ph),
+            )
+            conn.commit()
+    return uid
+
+# --------------------------- SESSIONS ---------------------------
+
+class SessionCache:
+    """Thread-safe LRU of recently validated session tokens."""
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: str):
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is not None:
+                self._entries.move_to_end(token_hash)
+            return entry
+
+    def put(self, token_hash: str, entry: tuple):
+        with self._lock:
+            self._entries[token_hash] = entry
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, token_hash: str):
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+@st.cache_resource
+def get_session_cache() -> SessionCache:
+    return SessionCache()
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def create_session(user_id: int) -> str:
+    token = secrets.token_urlsafe(32)
+    now = int(time.time())
+    with get_conn() as conn:
+        conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+        conn.execute(
+            "INSERT INTO sessions (token_hash, user_id, created_at, expires_at) VALUES (?,?,?,?)",
+            (_token_hash(token), user_id, dt.datetime.utcnow().isoformat(), now + SESSION_TTL_SECONDS),
+        )
+        conn.commit()
+    return token
+
+def resolve_session(token: str):
+    # Returns (user_id, username) for a live token. Within SESSION_RECHECK_SECONDS of the
+    # last check this is a single dict lookup; after that the row is re-read and its expiry slid.
+    if not token:
+        return None
+    token_hash = _token_hash(token)
+    cache = get_session_cache()
+    now = int(time.time())
+    entry = cache.get(token_hash)
+    if entry is not None:
+        user_id, username, checked_at = entry
+        if now - checked_at < SESSION_RECHECK_SECONDS:
+            return user_id, username
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT s.user_id, u.username FROM sessions s JOIN users u ON u.id = s.user_id "
+            "WHERE s.token_hash=? AND s.expires_at >= ?",
+            (token_hash, now),
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE sessions SET expires_at=? WHERE token_hash=?",
+                         (now + SESSION_TTL_SECONDS, token_hash))
+            conn.commit()
+    if not row:
+        cache.discard(token_hash)
+        return None
+    cache.put(token_hash, (row[0], row[1], now))
+    return row[0], row[1]
+
+def revoke_session(token: str):
+    token_hash = _token_hash(token)
+    get_session_cache().discard(token_hash)
+    with get_conn() as conn:
+        conn.execute("DELETE FROM sessions WHERE token_hash=?", (token_hash,))
+        conn.commit()
+
+@st.cache_resource
+def get_download_key() -> bytes:
+    with get_conn() as conn:
+        return conn.execute("SELECT value FROM app_secrets WHERE name='download_key'").fetchone()[0].encode()
+
+def _download_signature(resource: str, user_id: int, expires: int) -> str:
+    message = f"{resource}|{user_id}|{expires}".encode()
+    return hmac.new(get_download_key(), message, hashlib.sha256).hexdigest()[:32]
+
+def sign_download(resource: str, user_id: int) -> str:
+    # Query string granting one resource (e.g. "attachments/12") to one user for a short
+    # while. It is not the login token, so a leaked link exposes one file, briefly.
+    # Expiry is rounded up so links stay identical across reruns within a window.
+    expires = (int(time.time()) // DOWNLOAD_LINK_TTL_SECONDS + 2) * DOWNLOAD_LINK_TTL_SECONDS
+    return f"u={user_id}&exp={expires}&sig={_download_signature(resource, user_id, expires)}"
+
+def verify_download(resource: str, query: dict) -> int | None:
+    # Returns the user id a download link was signed for, or None if it is forged or stale.
+    try:
+        user_id, expires = int(query["u"][0]), int(query["exp"][0])
+        signature = query["sig"][0]
+    except (KeyError, IndexError, ValueError):
+        return None
+    if expires < time.time():
+        return None
+    if not hmac.compare_digest(signature, _download_signature(resource, user_id, expires)):
+        return None
+    return user_id
 
 # --------------------------- NOTES + ATTACHMENTS ---------------------------
 
-def add_note(user_id: int, title: str, content: str, attachment_path: str | None):
+def stage_upload(stream, name: str) -> tuple[Path, str, int, str]:
+    # Copies an upload to a temp file in fixed-size chunks, hashing as it writes, so
+    # the app never holds a second full copy. Returns (temp path, sha256, size, name)
+    # for add_note/update_note to commit.
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return Path(tmp), digest.hexdigest(), size, Path(name).name
+
+def _attach_blob(conn: sqlite3.Connection, staged: tuple) -> str:
+    # Must run inside a write transaction. Blobs are only placed, or unlinked by
+    # _unlink_released(), while the write lock is held, so a delete cannot race this reference.
+    tmp, sha, size, _name = staged
+    dest = BLOB_DIR / sha[:2] / sha
+    if dest.exists():
+        tmp.unlink(missing_ok=True)
+    else:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, dest)
+    conn.execute(
+        "INSERT INTO attachments (sha256, path, size, refcount, created_at) VALUES (?,?,?,1,?) "
+        "ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1",
+        (sha, str(dest), size, dt.datetime.utcnow().isoformat()),
+    )
+    return str(dest)
+
+def _release_blob(conn: sqlite3.Connection, path: str) -> str | None:
+    # Drops one reference and returns the path if it was the last one. The caller unlinks
+    # it with _unlink_released() after committing, so a rollback never loses a file.
+    # Blob files are named by their hash, so the primary key lookup needs no extra index.
+    row = conn.execute("SELECT sha256, refcount FROM attachments WHERE sha256=?", (Path(path).name,)).fetchone()
+    if row is None:
+        # Uploads from before deduplication belong to exactly one note.
+        return path
+    if row[1] <= 1:
+        conn.execute("DELETE FROM attachments WHERE sha256=?", (row[0],))
+        return path
+    conn.execute("UPDATE attachments SET refcount = refcount - 1 WHERE sha256=?", (row[0],))
+    return None
+
+def _unlink_released(conn: sqlite3.Connection, paths: list[str]):
+    # Runs after the releasing commit, under the write lock again: an upload of the same
+    # content may have re-referenced the blob in between, and then it must stay.
+    # Failing here only leaves an unreferenced file behind; the note change already stands.
+    if not paths:
+        return
+    try:
+        with transaction(conn):
+            for path in paths:
+                if conn.execute("SELECT 1 FROM attachments WHERE sha256=?", (Path(path).name,)).fetchone() is None:
+                    Path(path).unlink(missing_ok=True)
+    except (OSError, sqlite3.OperationalError):
+        pass
+
+def add_note(user_id: int, title: str, content: str, attachment: tuple | None = None):
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO notes (user_id, title, content, attachment, created_at, updated_at) VALUES (?,?,?,?,?,?)",
-            (user_id, title, content, attachment_path, now, now),
+    try:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO notes (user_id, title, content, created_at, updated_at) VALUES (?,?,?,?,?)",
+                (user_id, title, content, now, now),
+            )
+            _index_note_terms(conn, user_id, cur.lastrowid, title, content)
+            if attachment is not None:
+                path = _attach_blob(conn, attachment)
+                cur.execute("UPDATE notes SET attachment=?, attachment_name=? WHERE id=?",
+                            (path, attachment[3], cur.lastrowid))
+            conn.commit()
+    finally:
+        if attachment is not None:
+            attachment[0].unlink(missing_ok=True)
+
+def add_notes(user_id: int, notes) -> int:
+    # notes: iterable of (title, content); one transaction for the whole batch.
+    now = dt.datetime.utcnow().isoformat()
+    with get_conn() as conn:
+        count = insert_many(
+            conn,
+            "INSERT INTO notes (user_id, title, content, created_at, updated_at) VALUES (?,?,?,?,?)",
+            ((user_id, title, content, now, now) for title, content in notes),
         )
+        if count:
+            # The write lock has been held since the first insert, so the batch got
+            # consecutive ids ending at last_insert_rowid().
+            last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for note_id, title, content in conn.execute(
+                    "SELECT id, title, content FROM notes WHERE id BETWEEN ? AND ?", (last - count + 1, last)
+            ).fetchall():
+                _index_note_terms(conn, user_id, note_id, title, content)
         conn.commit()
+    return count
 
-def update_note(note_id: int, title: str, content: str, attachment_path: str | None = None):
+def update_note(note_id: int, title: str, content: str, attachment: tuple | None = None):
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
-        cur = conn.cursor()
-        if attachment_path is None:
+    try:
+        with get_conn() as conn:
+            cur = conn.cursor()
             cur.execute(
                 "UPDATE notes SET title=?, content=?, updated_at=? WHERE id=?",
                 (title, content, now, note_id),
             )
-        else:
-            cur.execute(
-                "UPDATE notes SET title=?, content=?, attachment=?, updated_at=? WHERE id=?",
-                (title, content, attachment_path, now, note_id),
-            )
-        conn.commit()
+            _unindex_note_terms(conn, note_id)
+            owner = cur.execute("SELECT user_id FROM notes WHERE id=?", (note_id,)).fetchone()
+            if owner:
+                _index_note_terms(conn, owner[0], note_id, title, content)
+            released = []
+            if attachment is not None:
+                cur.execute("SELECT attachment FROM notes WHERE id=?", (note_id,))
+                row = cur.fetchone()
+                path = _attach_blob(conn, attachment)
+                if row and row[0]:
+                    released.append(_release_blob(conn, row[0]))
+                cur.execute("UPDATE notes SET attachment=?, attachment_name=? WHERE id=?",
+                            (path, attachment[3], note_id))
+            conn.commit()
+            _unlink_released(conn, [p for p in released if p])
+        get_pdf_cache().invalidate(note_id)
+    finally:
+        if attachment is not None:
+            attachment[0].unlink(missing_ok=True)
 
 def delete_note(note_id: int):
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute("SELECT attachment FROM notes WHERE id=?", (note_id,))
         row = cur.fetchone()
-        if row and row[0]:
-            try:
-                p = Path(row[0])
-                if p.exists():
-                    p.unlink()
-            except Exception:
-                pass
         cur.execute("DELETE FROM notes WHERE id=?", (note_id,))
+        _unindex_note_terms(conn, note_id)
+        released = _release_blob(conn, row[0]) if row and row[0] else None
         conn.commit()
+        _unlink_released(conn, [released] if released else [])
+    get_pdf_cache().invalidate(note_id)
 
-def list_notes(user_id: int):
-    with closing(get_conn()) as conn:
+def list_note_headers(user_id: int, limit: int = NOTES_PAGE_SIZE, cursor: tuple | None = None):
+    # cursor is the (updated_at, id) of the last note on the previous page.
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, title, content, attachment, created_at, updated_at FROM notes WHERE user_id=? ORDER BY updated_at DESC",
-            (user_id,),
-        )
+        if cursor is None:
+            cur.execute(SQL_LIST_NOTE_HEADERS, (user_id, limit))
+        else:
+            cur.execute(SQL_LIST_NOTE_HEADERS_AFTER, (user_id, cursor[0], cursor[1], limit))
+        return cur.fetchall()
+
+def get_note_content(note_id: int, user_id: int):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT content FROM notes WHERE id=? AND user_id=?", (note_id, user_id))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+def fts_query(text: str) -> str:
+    # Every word becomes a quoted prefix term, so user input can never be parsed as
+    # FTS5 syntax. Terms are ANDed: "photo syn" matches a note containing both
+    # "photosynthesis" and "synthesis", but a word is only matched from its start.
+    return " ".join(f'"{term}"*' for term in re.findall(r"\w+", text))
+
+def search_notes(user_id: int, text: str, limit: int = NOTES_PAGE_SIZE):
+    query = fts_query(text)
+    if not query:
+        return []
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_SEARCH_NOTES, (query, user_id, limit))
         return cur.fetchall()
 
 # --------------------------- FLASHCARDS ---------------------------
 
+# SM-2 grades offered after each card; below 3 counts as a lapse.
+REVIEW_GRADES = {"Again": 1, "Hard": 3, "Good": 4, "Easy": 5}
+REVIEW_BATCH_SIZE = 20
+# A lapsed card comes back after this long instead of waiting a whole day.
+RELEARN_SECONDS = 10 * 60
+
+FLASHCARD_FORMATS = {"csv": "CSV", "tsv": "TSV", "jsonl": "JSON lines", "anki": "Anki plain-text export"}
+ANKI_SEPARATORS = {"tab": "\t", "comma": ",", "semicolon": ";", "pipe": "|", "space": " ", "colon": ":"}
+
+def question_hash(question: str) -> str:
+    # Case and whitespace differences do not make a card new.
+    return hashlib.sha256(" ".join(question.split()).casefold().encode()).hexdigest()
+
 def add_flashcard(user_id, question, answer):
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO flashcards (user_id, question, answer, created_at) VALUES (?,?,?,?)",
-            (user_id, question, answer, now)
+            "INSERT INTO flashcards (user_id, question, answer, created_at, question_hash) VALUES (?,?,?,?,?)",
+            (user_id, question, answer, now, question_hash(question))
+        )
+        conn.commit()
+
+def add_flashcards(user_id: int, cards) -> int:
+    # cards: iterable of (question, answer). Questions the user already has, or that
+    # repeat earlier in the same batch, are skipped; returns how many were inserted.
+    now = dt.datetime.utcnow().isoformat()
+
+    def rows():
+        for question, answer in cards:
+            qhash = question_hash(question)
+            yield (user_id, question, answer, now, qhash, user_id, qhash)
+
+    with get_conn() as conn:
+        count = insert_many(
+            conn,
+            "INSERT INTO flashcards (user_id, question, answer, created_at, question_hash) "
+            f"SELECT ?,?,?,?,? WHERE NOT EXISTS ({SQL_FLASHCARD_EXISTS})",
+            rows(),
         )
         conn.commit()
+    return count
+
+def detect_flashcard_format(filename: str) -> str:
+    suffix = Path(filename).suffix.lower()
+    return {".tsv": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".txt": "anki"}.get(suffix, "csv")
+
+def _anki_field(value: str) -> str:
+    value = re.sub(r"<br\s*/?>|</div>|</p>", "\n", value, flags=re.IGNORECASE)
+    return html.unescape(re.sub(r"<[^>]+>", "", value)).strip()
+
+def _split_rows(lines, delimiter: str, skip_header: bool = True):
+    for lineno, row in enumerate(csv.reader(lines, delimiter=delimiter), 1):
+        if lineno == 1 and skip_header and [c.strip().lower() for c in row[:2]] == ["question", "answer"]:
+            continue
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+def _anki_rows(lines):
+    # Anki "Notes in Plain Text" exports start with "#key:value" header lines
+    # (separator, html, column numbers) followed by delimited rows.
+    lines = iter(lines)
+    delimiter, is_html, first = "\t", True, None
+    for line in lines:
+        if not line.startswith("#"):
+            first = line
+            break
+        key, _, value = line[1:].strip().partition(":")
+        if key == "separator":
+            delimiter = ANKI_SEPARATORS.get(value.lower(), value[:1] or "\t")
+        elif key == "html":
+            is_html = value.lower() == "true"
+    if first is None:
+        return
+    for question, answer in _split_rows(itertools.chain([first], lines), delimiter, skip_header=False):
+        yield (_anki_field(question), _anki_field(answer)) if is_html else (question, answer)
+
+def _jsonl_rows(lines):
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"line {lineno}: {exc.msg}") from None
+        if isinstance(item, dict):
+            yield item.get("question", item.get("front", "")), item.get("answer", item.get("back", ""))
+        elif isinstance(item, list) and len(item) >= 2:
+            yield item[0], item[1]
+        else:
+            raise ValueError(f"line {lineno}: expected an object or a [question, answer] pair")
+
+def iter_flashcards(lines, fmt: str):
+    # Streams (question, answer) pairs from a text file object or any iterable of lines;
+    # nothing beyond the current row is held in memory. Blank cards are dropped.
+    if fmt == "csv":
+        rows = _split_rows(lines, ",")
+    elif fmt == "tsv":
+        rows = _split_rows(lines, "\t")
+    elif fmt == "jsonl":
+        rows = _jsonl_rows(lines)
+    elif fmt == "anki":
+        rows = _anki_rows(lines)
+    else:
+        raise ValueError(f"Unknown flashcard format {fmt!r}.")
+    for question, answer in rows:
+        question, answer = str(question).strip(), str(answer).strip()
+        if question and answer:
+            yield question, answer
+
+def import_flashcards(user_id: int, binary_file, fmt: str) -> tuple[int, int]:
+    # Returns (imported, duplicates skipped). A parse error rolls back the whole import.
+    parsed = 0
+
+    def counted(cards):
+        nonlocal parsed
+        for card in cards:
+            parsed += 1
+            yield card
+
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        imported = add_flashcards(user_id, counted(iter_flashcards(text, fmt)))
+    finally:
+        # Leave the caller's file open; only the text wrapper is ours.
+        text.detach()
+    return imported, parsed - imported
+
+def list_flashcards(user_id, limit: int = -1):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_LIST_FLASHCARDS, (user_id, limit))
+        return cur.fetchall()
 
-def list_flashcards(user_id):
-    with closing(get_conn()) as conn:
+def sm2(ease: float, interval_days: float, reps: int, lapses: int, grade: int) -> tuple[float, float, int, int]:
+    # SuperMemo-2: returns the card's new (ease, interval_days, reps, lapses).
+    # interval_days == 0 means "relearn shortly".
+    if grade < 3:
+        reps, lapses, interval_days = 0, lapses + 1, 0
+    else:
+        reps += 1
+        interval_days = 1 if reps == 1 else 6 if reps == 2 else round(interval_days * ease, 1)
+    ease = max(1.3, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return ease, interval_days, reps, lapses
+
+def grade_card(card: tuple, grade: int, now: int | None = None) -> tuple:
+    # card is a row of SQL_DUE_FLASHCARDS; returns the outcome record_reviews() expects.
+    card_id, _question, _answer, ease, interval_days, reps, lapses = card
+    now = int(time.time()) if now is None else now
+    ease, interval_days, reps, lapses = sm2(ease, interval_days, reps, lapses, grade)
+    due_at = now + (int(interval_days * 86400) if interval_days else RELEARN_SECONDS)
+    return card_id, grade, ease, interval_days, reps, lapses, due_at, now
+
+def due_flashcards(user_id: int, limit: int = REVIEW_BATCH_SIZE, now: int | None = None):
+    # Walks idx_flashcards_user_due from the oldest due card and stops after limit rows,
+    # so the cost does not grow with the size of the deck.
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT id, question, answer FROM flashcards WHERE user_id=? ORDER BY id DESC", (user_id,))
+        cur.execute(SQL_DUE_FLASHCARDS, (user_id, int(time.time()) if now is None else now, limit))
         return cur.fetchall()
 
+def next_due_at(user_id: int) -> int | None:
+    with get_conn() as conn:
+        return conn.execute(SQL_NEXT_DUE_FLASHCARD, (user_id,)).fetchone()[0]
+
+def record_reviews(user_id: int, outcomes) -> int:
+    # outcomes: grade_card() results, written in one transaction.
+    outcomes = list(outcomes)
+    if not outcomes:
+        return 0
+    with get_conn() as conn:
+        conn.executemany(
+            "UPDATE flashcards SET ease=?, interval_days=?, reps=?, lapses=?, due_at=? WHERE id=? AND user_id=?",
+            [(ease, interval, reps, lapses, due_at, card_id, user_id)
+             for card_id, _grade, ease, interval, reps, lapses, due_at, _now in outcomes],
+        )
+        conn.executemany(
+            "INSERT INTO flashcard_reviews (card_id, user_id, grade, interval_days, reviewed_at) VALUES (?,?,?,?,?)",
+            [(card_id, user_id, grade, interval, reviewed_at)
+             for card_id, grade, _ease, interval, _reps, _lapses, _due_at, reviewed_at in outcomes],
+        )
+        conn.commit()
+    return len(outcomes)
+
 # --------------------------- QUIZZES ---------------------------
 
-def add_quiz(user_id, title, questions_json):
+QUIZ_FORMAT_HELP = """JSON: [{"question": "...", "choices": ["...", "..."], "answer": 0, "topic": "..."}]
+
+or the simple format, one blank line between questions:
+
+    Topic: Cell biology
+    Q: Which organelle makes ATP?
+    - Ribosome
+    * Mitochondrion
+    - Golgi apparatus
+
+"* " marks the correct choice; a Topic line applies to the questions after it."""
+
+def _quiz_question(prompt, choices, topic, where: str) -> dict:
+    # Every question, whatever format it came from, is checked here before anything is saved.
+    prompt = str(prompt or "").strip()
+    if not prompt:
+        raise ValueError(f"{where}: the question text is empty.")
+    choices = [(str(text).strip(), bool(correct)) for text, correct in choices]
+    if len(choices) < 2 or any(not text for text, _correct in choices):
+        raise ValueError(f"{where}: needs at least two non-empty choices.")
+    if sum(correct for _text, correct in choices) != 1:
+        raise ValueError(f"{where}: mark exactly one choice as correct.")
+    return {"prompt": prompt, "topic": (str(topic).strip() or None) if topic else None, "choices": choices}
+
+def _parse_quiz_json(data) -> list[dict]:
+    if isinstance(data, dict):
+        data = data.get("questions")
+    if not isinstance(data, list):
+        raise ValueError("JSON quizzes are a list of questions (or an object with a \"questions\" list).")
+    questions = []
+    for number, item in enumerate(data, 1):
+        where = f"Question {number}"
+        if not isinstance(item, dict):
+            raise ValueError(f"{where}: expected an object.")
+        choices = item.get("choices", item.get("options"))
+        if not isinstance(choices, list):
+            raise ValueError(f"{where}: \"choices\" must be a list.")
+        answer = item.get("answer")
+        parsed = []
+        for index, choice in enumerate(choices):
+            if isinstance(choice, dict):
+                parsed.append((choice.get("text", ""), choice.get("correct", False)))
+            else:
+                parsed.append((choice, answer == index if isinstance(answer, int) else answer == choice))
+        questions.append(_quiz_question(item.get("question", item.get("prompt")), parsed, item.get("topic"), where))
+    return questions
+
+def _parse_quiz_simple(text: str) -> list[dict]:
+    questions, topic, current = [], None, None
+
+    def finish():
+        if current is not None:
+            questions.append(_quiz_question(current[1], current[2], current[3], f"Line {current[0]}"))
+
+    for lineno, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line:
+            continue
+        if re.match(r"topic\s*:", line, re.IGNORECASE):
+            topic = line.split(":", 1)[1].strip()
+        elif re.match(r"q\s*:", line, re.IGNORECASE):
+            finish()
+            current = (lineno, line.split(":", 1)[1], [], topic)
+        elif line[:2] in ("- ", "* "):
+            if current is None:
+                raise ValueError(f"Line {lineno}: choice before the first \"Q:\" line.")
+            current[2].append((line[2:], line[0] == "*"))
+        else:
+            raise ValueError(f"Line {lineno}: expected \"Q:\", \"Topic:\", \"- choice\" or \"* correct choice\".")
+    finish()
+    return questions
+
+def parse_quiz(source: str) -> list[dict]:
+    # Raises ValueError naming the offending question or line.
+    source = source.strip()
+    if source[:1] in "[{":
+        try:
+            data = json.loads(source)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON at line {exc.lineno}: {exc.msg}") from None
+        questions = _parse_quiz_json(data)
+    else:
+        questions = _parse_quiz_simple(source)
+    if not questions:
+        raise ValueError("The quiz has no questions.")
+    return questions
+
+def _insert_quiz_questions(conn: sqlite3.Connection, quiz_id: int, questions: list[dict]):
+    for position, question in enumerate(questions):
+        cur = conn.execute(
+            "INSERT INTO quiz_questions (quiz_id, position, prompt, topic) VALUES (?,?,?,?)",
+            (quiz_id, position, question["prompt"], question["topic"]),
+        )
+        conn.executemany(
+            "INSERT INTO quiz_choices (question_id, position, text, is_correct) VALUES (?,?,?,?)",
+            [(cur.lastrowid, index, text, int(correct)) for index, (text, correct) in enumerate(question["choices"])],
+        )
+
+def add_quiz(user_id, title, source):
+    # Parses before touching the database, so an invalid quiz is rejected whole.
+    return save_quiz(user_id, title, source, parse_quiz(source))
+
+def save_quiz(user_id: int, title: str, source: str, questions: list[dict]) -> int:
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute("INSERT INTO quizzes (user_id, title, questions, created_at) VALUES (?,?,?,?)",
-                    (user_id, title, questions_json, now))
+                    (user_id, title, source, now))
+        quiz_id = cur.lastrowid
+        _insert_quiz_questions(conn, quiz_id, questions)
         conn.commit()
+    return quiz_id
 
 def list_quizzes(user_id):
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT id, title, questions FROM quizzes WHERE user_id=? ORDER BY id DESC", (user_id,))
+        cur.execute(SQL_LIST_QUIZZES, (user_id,))
         return cur.fetchall()
 
+def get_quiz_source(quiz_id: int, user_id: int):
+    with get_conn() as conn:
+        row = conn.execute("SELECT questions FROM quizzes WHERE id=? AND user_id=?", (quiz_id, user_id)).fetchone()
+        return row[0] if row else None
+
+def get_quiz_questions(quiz_id: int) -> list[tuple]:
+    # [(question_id, prompt, topic, [(choice_id, text, is_correct), ...]), ...] in quiz order.
+    questions = []
+    with get_conn() as conn:
+        for qid, prompt, topic, choice_id, text, is_correct in conn.execute(SQL_QUIZ_QUESTIONS, (quiz_id,)):
+            if not questions or questions[-1][0] != qid:
+                questions.append((qid, prompt, topic, []))
+            questions[-1][3].append((choice_id, text, bool(is_correct)))
+    return questions
+
+def submit_attempt(user_id: int, quiz_id: int, started_at: str, answers) -> tuple[int, int, int]:
+    # answers: (question_id, choice_id or None, elapsed_ms) per question. Correctness is
+    # looked up from quiz_choices inside the insert, so the client cannot claim a score.
+    # Returns (attempt_id, score, total).
+    now = dt.datetime.utcnow().isoformat()
+    answers = list(answers)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO quiz_attempts (quiz_id, user_id, started_at, finished_at, score, total) VALUES (?,?,?,?,0,?)",
+            (quiz_id, user_id, started_at, now, len(answers)),
+        )
+        attempt_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO quiz_answers (attempt_id, question_id, choice_id, is_correct, elapsed_ms) "
+            "VALUES (?,?,?,COALESCE((SELECT is_correct FROM quiz_choices WHERE id=? AND question_id=?), 0),?)",
+            [(attempt_id, qid, choice_id, choice_id, qid, elapsed_ms) for qid, choice_id, elapsed_ms in answers],
+        )
+        score = cur.execute("SELECT COALESCE(SUM(is_correct), 0) FROM quiz_answers WHERE attempt_id=?",
+                            (attempt_id,)).fetchone()[0]
+        cur.execute("UPDATE quiz_attempts SET score=? WHERE id=?", (score, attempt_id))
+        conn.commit()
+    return attempt_id, score, len(answers)
+
+def list_attempts(user_id: int, quiz_id: int, limit: int = 5):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_LIST_ATTEMPTS, (user_id, quiz_id, limit))
+        return cur.fetchall()
+
+def last_attempt_id(user_id: int) -> int | None:
+    with get_conn() as conn:
+        return conn.execute(SQL_LAST_ATTEMPT, (user_id,)).fetchone()[0]
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def quiz_analytics(user_id: int, last_attempt: int | None) -> dict:
+    # last_attempt only versions the cache: a new attempt changes the key, so stale
+    # results are never served and nothing has to be invalidated explicitly. The frames
+    # are shared rather than copied per hit, so callers must treat them as read-only.
+    with get_conn() as conn:
+        return analytics.summarize(conn, user_id)
+
+# --------------------------- QUIZ GENERATION ---------------------------
+
+QUIZ_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers herself him himself his how i if in into is it its itself just
+me more most my myself no nor not now of off on once only or other our ours ourselves out over
+own same she should so some such than that the their theirs them themselves then there these
+they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours yourself yourselves one two three many much may might
+must shall use used using via etc eg ie get got make made like well way
+""".split())
+
+def note_term_counts(title: str, content: str) -> dict[str, int]:
+    # Lower-cased words of three or more letters, minus stopwords. Title words count twice.
+    counts: dict[str, int] = {}
+    for weight, text in ((2, title), (1, content)):
+        for term in re.findall(r"[^\W\d_]{3,}", text.lower()):
+            if term not in QUIZ_STOPWORDS:
+                counts[term] = counts.get(term, 0) + weight
+    return counts
+
+def _index_note_terms(conn: sqlite3.Connection, user_id: int, note_id: int, title: str, content: str):
+    counts = note_term_counts(title, content)
+    conn.executemany(
+        "INSERT INTO note_terms (note_id, term, user_id, tf) VALUES (?,?,?,?)",
+        [(note_id, term, user_id, tf) for term, tf in counts.items()],
+    )
+    conn.executemany(
+        "INSERT INTO corpus_terms (user_id, term, df) VALUES (?,?,1) "
+        "ON CONFLICT(user_id, term) DO UPDATE SET df = df + 1",
+        [(user_id, term) for term in counts],
+    )
+
+def _unindex_note_terms(conn: sqlite3.Connection, note_id: int):
+    conn.execute("""
+        UPDATE corpus_terms SET df = df - 1
+        WHERE (user_id, term) IN (SELECT user_id, term FROM note_terms WHERE note_id=?)
+    """, (note_id,))
+    conn.execute("""
+        DELETE FROM corpus_terms
+        WHERE df <= 0 AND (user_id, term) IN (SELECT user_id, term FROM note_terms WHERE note_id=?)
+    """, (note_id,))
+    conn.execute("DELETE FROM note_terms WHERE note_id=?", (note_id,))
+
+def note_keywords(conn: sqlite3.Connection, user_id: int, note_id: int, limit: int) -> list[str]:
+    # Top terms of one note by TF-IDF against the user's own notes.
+    notes = conn.execute(SQL_COUNT_NOTES, (user_id,)).fetchone()[0]
+    weights = [
+        (tf * (math.log((notes + 1) / (df + 1)) + 1), term)
+        for term, tf, df in conn.execute(SQL_NOTE_TERM_WEIGHTS, (note_id,))
+    ]
+    return [term for _weight, term in sorted(weights, reverse=True)[:limit]]
+
+def related_notes(conn: sqlite3.Connection, note_id: int, limit: int = 5):
+    # Notes sharing the most terms with this one: the note's own terms (primary key)
+    # joined to everyone else's postings through the (user_id, term) index.
+    return conn.execute(SQL_RELATED_NOTES, (note_id, limit)).fetchall()
+
+def _cloze_sentence(content: str, term: str) -> str | None:
+    pattern = re.compile(rf"\b{re.escape(term)}\b", re.IGNORECASE)
+    for sentence in re.split(r"(?<=[.!?])\s+|\n+", content):
+        sentence = sentence.strip(" -*#\t")
+        if 4 <= len(sentence.split()) <= 40 and pattern.search(sentence):
+            return pattern.sub("_____", sentence)
+    return None
+
+def generate_quiz(user_id: int, note_id: int, count: int = 5) -> list[dict]:
+    # Offline question generation from one note, in the same shape parse_quiz() returns:
+    # cloze questions on the note's top keywords, with the keywords of related notes as
+    # distractors, plus a "which note" question when there are related notes to choose from.
+    rnd = secrets.SystemRandom()
+    with get_conn() as conn:
+        row = conn.execute("SELECT title, content FROM notes WHERE id=? AND user_id=?", (note_id, user_id)).fetchone()
+        if row is None:
+            raise ValueError("Note not found.")
+        title, content = row
+        keywords = note_keywords(conn, user_id, note_id, limit=count * 3)
+        related = related_notes(conn, note_id)
+        own_terms = {term for (term,) in conn.execute("SELECT term FROM note_terms WHERE note_id=?", (note_id,))}
+        distractors = []
+        for other_id, _other_title in related:
+            distractors += [t for t in note_keywords(conn, user_id, other_id, limit=10)
+                            if t not in own_terms and t not in distractors]
+    questions, used = [], set()
+    for term in keywords:
+        if len(questions) >= count:
+            break
+        sentence = _cloze_sentence(content, term)
+        if sentence is None or sentence.replace("_____", term).lower() in used:
+            continue
+        used.add(sentence.replace("_____", term).lower())
+        # Related-note keywords first; other keywords of this note only as a fallback.
+        pool = distractors or [k for k in keywords if k != term]
+        wrong = rnd.sample(pool, min(3, len(pool)))
+        if not wrong:
+            continue
+        choices = [(term, True)] + [(w, False) for w in wrong]
+        rnd.shuffle(choices)
+        questions.append({"prompt": f"Fill in the blank: {sentence}", "topic": title, "choices": choices})
+    if related and keywords and len(questions) < count:
+        choices = [(title, True)] + [(other_title, False) for _id, other_title in related[:3] if other_title != title]
+        if len(choices) > 1:
+            rnd.shuffle(choices)
+            questions.append({
+                "prompt": f"Which of your notes is most about “{keywords[0]}”?", "topic": title, "choices": choices,
+            })
+    if not questions:
+        raise ValueError("This note is too short to generate questions from.")
+    return questions
+
+def generate_quiz_from_note(user_id: int, note_id: int, title: str, count: int = 5) -> tuple[int, int]:
+    # Saves the generated questions as an ordinary quiz; returns (quiz_id, questions).
+    questions = generate_quiz(user_id, note_id, count)
+    source = json.dumps([
+        {"question": q["prompt"], "topic": q["topic"],
+         "choices": [text for text, _correct in q["choices"]],
+         "answer": next(i for i, (_text, correct) in enumerate(q["choices"]) if correct)}
+        for q in questions
+    ], ensure_ascii=False, indent=1)
+    return save_quiz(user_id, f"From: {title}", source, questions), len(questions)
+
 # --------------------------- GOALS ---------------------------
 
 def add_goal(user_id, goal, target_value):
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute("INSERT INTO goals (user_id, goal, target_value, progress, created_at, updated_at) VALUES (?,?,?,?,?,?)",
                     (user_id, goal, target_value, 0, now, now))
+        cur.execute("INSERT INTO goal_events (goal_id, ts, progress) VALUES (?,?,0)", (cur.lastrowid, int(time.time())))
         conn.commit()
 
 def update_goal_progress(goal_id, progress):
+    # goals.progress is the current value; every change is also appended to goal_events.
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute("UPDATE goals SET progress=?, updated_at=? WHERE id=?", (progress, now, goal_id))
+        cur.execute("INSERT INTO goal_events (goal_id, ts, progress) VALUES (?,?,?)", (goal_id, int(time.time()), progress))
         conn.commit()
 
+def goal_last_event(goal_id: int) -> int | None:
+    with get_conn() as conn:
+        row = conn.execute(analytics.SQL_GOAL_LAST_EVENT, (goal_id,)).fetchone()
+        return row[0] if row else None
+
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def goal_history(goal_id: int, last_event: int | None, target: int) -> tuple:
+    # Keyed on the newest event id, like quiz_analytics(): a new event is a new entry.
+    # Returns (downsampled series, projection); treat both as read-only.
+    with get_conn() as conn:
+        series = analytics.goal_series(conn, goal_id)
+    return series, analytics.project_completion(series, target)
+
 def list_goals(user_id):
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT id, goal, target_value, progress FROM goals WHERE user_id=? ORDER BY updated_at DESC", (user_id,))
+        cur.execute(SQL_LIST_GOALS, (user_id,))
         return cur.fetchall()
 
 # --------------------------- TASKS + REMINDERS ---------------------------
 
+def task_epochs(due_date: str | None, remind_before_hours: int | None) -> tuple[int | None, int | None]:
+    # (due_at, remind_at) as UTC epoch seconds. Naive due dates are the student's local
+    # time. Raises ValueError for a due date that is not ISO 8601.
+    if not due_date:
+        return None, None
+    due_at = int(dt.datetime.fromisoformat(due_date).timestamp())
+    return due_at, due_at - (remind_before_hours or 0) * 3600
+
 def add_task(user_id: int, task: str, due_date: str | None, remind_before_hours: int | None = 0):
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
+    due_at, remind_at = task_epochs(due_date, remind_before_hours)
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO tasks (user_id, task, due_date, remind_before_hours, done, created_at, updated_at) VALUES (?,?,?,?,?,?,?)",
-            (user_id, task, due_date, remind_before_hours or 0, 0, now, now),
+            "INSERT INTO tasks (user_id, task, due_date, remind_before_hours, due_at, remind_at, done, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?,?,?,?)",
+            (user_id, task, due_date, remind_before_hours or 0, due_at, remind_at, 0, now, now),
+        )
+        conn.commit()
+    _task_changed(cur.lastrowid)
+
+def add_tasks(user_id: int, tasks) -> int:
+    # tasks: iterable of (task, due_date, remind_before_hours). A bad due date raises
+    # ValueError and rolls back the whole batch.
+    now = dt.datetime.utcnow().isoformat()
+    remind_ats = []
+
+    def rows():
+        for task, due_date, remind_before_hours in tasks:
+            due_at, remind_at = task_epochs(due_date, remind_before_hours)
+            remind_ats.append(remind_at)
+            yield (user_id, task, due_date, remind_before_hours or 0, due_at, remind_at, 0, now, now)
+
+    with get_conn() as conn:
+        count = insert_many(
+            conn,
+            "INSERT INTO tasks (user_id, task, due_date, remind_before_hours, due_at, remind_at, done, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?,?,?,?)",
+            rows(),
         )
+        # As in add_notes, the batch got consecutive ids ending at last_insert_rowid().
+        first = conn.execute("SELECT last_insert_rowid()").fetchone()[0] - count + 1
         conn.commit()
+    if st.runtime.exists() and count:
+        get_reminder_scheduler().add(zip(itertools.count(first), remind_ats))
+    return count
 
 def toggle_task(task_id: int, done: bool):
     now = dt.datetime.utcnow().isoformat()
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         cur.execute(
             "UPDATE tasks SET done=?, updated_at=? WHERE id=?",
             (1 if done else 0, now, task_id),
         )
         conn.commit()
+    _task_changed(task_id)
 
 def delete_task(task_id: int):
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
+        cur.execute(
+            "UPDATE users SET tasks_deleted_at=? WHERE id=(SELECT user_id FROM tasks WHERE id=?)",
+            (dt.datetime.utcnow().isoformat(), task_id),
+        )
         cur.execute("DELETE FROM tasks WHERE id=?", (task_id,))
         conn.commit()
+    _task_changed(task_id)
 
 def list_tasks(user_id: int):
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, task, due_date, remind_before_hours, done, created_at, updated_at FROM tasks WHERE user_id=? ORDER BY done, COALESCE(due_date,''), updated_at DESC",
-            (user_id,),
-        )
+        cur.execute(SQL_LIST_TASKS, (user_id,))
         return cur.fetchall()
 
+def list_upcoming_reminders(user_id: int, within: dt.timedelta = dt.timedelta(days=7)):
+    now = int(time.time())
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_UPCOMING_REMINDERS, (user_id, now, now + int(within.total_seconds())))
+        return cur.fetchall()
+
+# --------------------------- REMINDER SCHEDULER ---------------------------
+
+class FileNotifier:
+    def __init__(self, path: Path = REMINDER_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, reminder: dict):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(reminder) + "\n")
+
+class QueueNotifier:
+    """In-process delivery: reminders wait per user until the app shows them."""
+
+    def __init__(self, per_user: int = 50):
+        self.per_user = per_user
+        self._queues: dict[int, deque] = {}
+        self._lock = threading.Lock()
+
+    def deliver(self, reminder: dict):
+        with self._lock:
+            self._queues.setdefault(reminder["user_id"], deque(maxlen=self.per_user)).append(reminder)
+
+    def drain(self, user_id: int) -> list[dict]:
+        with self._lock:
+            pending = self._queues.pop(user_id, None)
+        return list(pending or [])
+
+class ReminderScheduler:
+    """Min-heap of pending reminders, serviced by one thread that sleeps until the next."""
+
+    def __init__(self, notifier):
+        self.notifier = notifier
+        self._heap: list[tuple[float, int, int]] = []
+        # task id -> sequence number of its live heap entry; anything else is stale.
+        self._live: dict[int, int] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+
+    def start(self):
+        with get_conn() as conn:
+            pending = conn.execute(SQL_PENDING_REMINDERS, (time.time(),)).fetchall()
+        self.add(pending)
+        self._thread.start()
+
+    def add(self, reminders):
+        # Schedules (task_id, remind_at) pairs for tasks just inserted, without reading
+        # them back; reminder times already past are skipped, as in SQL_PENDING_REMINDERS.
+        now = time.time()
+        with self._cond:
+            for task_id, remind_at in reminders:
+                if remind_at is not None and remind_at > now:
+                    seq = next(self._seq)
+                    self._live[task_id] = seq
+                    heapq.heappush(self._heap, (remind_at, seq, task_id))
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _schedule(self, task_id: int, when: float | None):
+        with self._cond:
+            if when is None:
+                self._live.pop(task_id, None)
+                return
+            seq = next(self._seq)
+            self._live[task_id] = seq
+            heapq.heappush(self._heap, (when, seq, task_id))
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+
+    def refresh(self, task_id: int):
+        # Re-reads one task by primary key after it was added, toggled or deleted.
+        # A reminder time already in the past is never scheduled, as at start-up.
+        with get_conn() as conn:
+            row = conn.execute(
+                "SELECT remind_at FROM tasks WHERE id=? AND done = 0 AND reminded_at IS NULL AND remind_at > ?",
+                (task_id, time.time()),
+            ).fetchone()
+        self._schedule(task_id, row[0] if row else None)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._live)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    # Entries superseded by a refresh or cancel are dropped lazily.
+                    while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][1]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(timeout=delay)
+                _when, _seq, task_id = heapq.heappop(self._heap)
+                self._live.pop(task_id, None)
+            try:
+                self._fire(task_id)
+            except Exception:
+                pass
+
+    def _fire(self, task_id: int):
+        now = dt.datetime.utcnow().isoformat()
+        with get_conn() as conn:
+            row = conn.execute(
+                "SELECT user_id, task, due_date, remind_at, due_at FROM tasks "
+                "WHERE id=? AND done = 0 AND reminded_at IS NULL",
+                (task_id,),
+            ).fetchone()
+            if row is None or row[3] is None:
+                return
+            when = row[3]
+            if when > time.time():
+                # Changed since it was queued; put it back at its new time.
+                self._schedule(task_id, when)
+                return
+            # Claiming the row makes delivery exactly-once even with several app processes.
+            # An overdue task is claimed too, so it is dropped for good instead of delivered.
+            overdue = row[4] is not None and row[4] + REMINDER_GRACE_SECONDS < time.time()
+            claimed = conn.execute(
+                "UPDATE tasks SET reminded_at=? WHERE id=? AND reminded_at IS NULL", (now, task_id)
+            ).rowcount
+            conn.commit()
+        if claimed and not overdue:
+            self.notifier.deliver({
+                "task_id": task_id, "user_id": row[0], "task": row[1], "due_date": row[2],
+                "remind_at": dt.datetime.fromtimestamp(when).isoformat(timespec="minutes"),
+            })
+
+@st.cache_resource
+def get_reminder_scheduler() -> ReminderScheduler:
+    notifier = FileNotifier() if REMINDER_NOTIFIER == "file" else QueueNotifier()
+    scheduler = ReminderScheduler(notifier)
+    scheduler.start()
+    atexit.register(scheduler.stop)
+    return scheduler
+
+def _task_changed(task_id: int):
+    # Only the Streamlit server runs a scheduler; CLI commands write without one.
+    if st.runtime.exists():
+        get_reminder_scheduler().refresh(task_id)
+
+def show_delivered_reminders():
+    notifier = get_reminder_scheduler().notifier
+    if isinstance(notifier, QueueNotifier):
+        for reminder in notifier.drain(st.session_state.user_id):
+            st.toast(f"🔔 {reminder['task']} — due {reminder['due_date'].replace('T', ' ')}")
+
 # --------------------------- EXPORTS ---------------------------
 
-def notes_to_pdf(notes: list[tuple]) -> bytes:
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", size=14)
-    pdf.cell(0, 8, "Notes Export", ln=1)
-    pdf.set_font("Arial", size=11)
-    for _id, title, content, attachment, created_at, updated_at in notes:
-        pdf.ln(2)
-        pdf.set_font("Arial", 'B', 12)
-        pdf.multi_cell(0, 7, f"{title} (updated {updated_at.split('T')[0]})")
-        pdf.set_font("Arial", size=11)
-        pdf.multi_cell(0, 6, content)
-        if attachment:
-            pdf.multi_cell(0, 6, f"Attachment: {attachment}")
-        pdf.ln(4)
-    return pdf.output(dest='S').encode('latin-1')
+@st.cache_resource
+def get_pdf_cache() -> PdfRenderCache:
+    return PdfRenderCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
 
-def tasks_to_ics(tasks: list[tuple]) -> bytes:
-    lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        "PRODID:-//StudentAssistance//EN",
-    ]
+def note_to_pdf(note: tuple) -> bytes:
+    return get_pdf_cache().render(note)
+
+@st.cache_resource
+def get_export_pool() -> ProcessPoolExecutor:
+    # "spawn" behaves the same on every OS and avoids forking a threaded server.
+    pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+    return pool
+
+def _export_paths(user_id: int, job_id: str) -> tuple[Path, Path]:
+    # Jobs live under the owner's directory, so any process can check ownership from the path.
+    user_dir = EXPORT_DIR / str(user_id)
+    return user_dir / f"{job_id}.pdf", user_dir / f"{job_id}.progress"
+
+def _purge_old_exports(user_dir: Path):
+    cutoff = time.time() - EXPORT_TTL_SECONDS
+    for path in user_dir.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+def submit_notes_export(user_id: int) -> str:
+    job_id = secrets.token_hex(8)
+    out_path, progress_path = _export_paths(user_id, job_id)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    _purge_old_exports(out_path.parent)
+    write_progress(progress_path, "queued")
+    future = get_export_pool().submit(
+        export_notes_job, str(DB_PATH.resolve()), user_id, str(out_path.resolve()), str(progress_path.resolve())
+    )
+
+    def record_crash(fut):
+        # A worker that dies (e.g. killed for memory) never writes its own error status.
+        exc = fut.exception()
+        if exc is not None and read_progress(progress_path)[0] != "error":
+            write_progress(progress_path, "error", 0, 0, str(exc) or type(exc).__name__)
+
+    future.add_done_callback(record_crash)
+    return job_id
+
+def export_job_status(user_id: int, job_id: str) -> tuple[str, int, int, str]:
+    return read_progress(_export_paths(user_id, job_id)[1])
+
+def ics_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def ics_line(line: str) -> bytes:
+    # RFC 5545 3.1: lines end in CRLF and are folded at 75 octets, never inside a
+    # multi-byte UTF-8 sequence; continuation lines start with a single space.
+    raw = line.encode()
+    if len(raw) <= 75:
+        return raw + b"\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(raw):
+        end = min(start + limit, len(raw))
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(raw[start:end])
+        start, limit = end, 74
+    return b"\r\n ".join(parts) + b"\r\n"
+
+def _ics_utc(iso_utc: str) -> str:
+    return dt.datetime.fromisoformat(iso_utc).strftime("%Y%m%dT%H%M%SZ")
+
+def iter_ics(tasks):
+    # Yields the calendar one folded line at a time, so any iterable of task rows
+    # (including a live cursor) can be streamed without building the document.
+    yield ics_line("BEGIN:VCALENDAR")
+    yield ics_line("VERSION:2.0")
+    yield ics_line("PRODID:-//StudentAssistance//EN")
+    yield ics_line("CALSCALE:GREGORIAN")
     for tid, task, due_date, remind, done, created_at, updated_at in tasks:
         if not due_date:
             continue
         try:
             dt_obj = dt.datetime.fromisoformat(due_date)
-        except Exception:
+        except ValueError:
             continue
-        dtstamp = dt_obj.strftime('%Y%m%dT%H%M%S')
-        uid = f"task-{tid}@student-assist"
-        lines += [
-            "BEGIN:VEVENT",
-            f"UID:{uid}",
-            f"DTSTAMP:{dtstamp}Z",
-            f"DTSTART:{dtstamp}Z",
-            f"SUMMARY:{task}",
-            "END:VEVENT",
-        ]
-    lines.append("END:VCALENDAR")
-    return "".join(lines).encode()
+        if dt_obj.tzinfo is None:
+            # Due dates are entered in the student's local time: emit a floating time.
+            start = dt_obj.strftime("%Y%m%dT%H%M%S")
+        else:
+            start = dt_obj.astimezone(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        summary = ics_escape(task)
+        yield ics_line("BEGIN:VEVENT")
+        yield ics_line(f"UID:task-{tid}@student-assist")
+        yield ics_line(f"DTSTAMP:{_ics_utc(updated_at)}")
+        yield ics_line(f"LAST-MODIFIED:{_ics_utc(updated_at)}")
+        yield ics_line(f"DTSTART:{start}")
+        yield ics_line(f"SUMMARY:{summary}")
+        if remind and not done:
+            yield ics_line("BEGIN:VALARM")
+            yield ics_line("ACTION:DISPLAY")
+            yield ics_line(f"DESCRIPTION:{summary}")
+            yield ics_line(f"TRIGGER:-PT{int(remind)}H")
+            yield ics_line("END:VALARM")
+        yield ics_line("END:VEVENT")
+    yield ics_line("END:VCALENDAR")
+
+def tasks_to_ics(tasks: list[tuple]) -> bytes:
+    return b"".join(iter_ics(tasks))
+
+def reset_calendar_feed(user_id: int) -> str:
+    # Only the hash is kept, so the URL is shown once; resetting revokes the old one.
+    token = secrets.token_urlsafe(24)
+    with get_conn() as conn:
+        conn.execute(
+            "INSERT INTO calendar_feeds (token_hash, user_id, created_at) VALUES (?,?,?) "
+            "ON CONFLICT(user_id) DO UPDATE SET token_hash=excluded.token_hash, created_at=excluded.created_at",
+            (_token_hash(token), user_id, dt.datetime.utcnow().isoformat()),
+        )
+        conn.commit()
+    return token
+
+def calendar_feed_user(token: str):
+    with get_conn() as conn:
+        row = conn.execute("SELECT user_id FROM calendar_feeds WHERE token_hash=?", (_token_hash(token),)).fetchone()
+    return row[0] if row else None
+
+def calendar_feed_version(user_id: int) -> tuple[str | None, int]:
+    # (time of the latest change, task count). The time covers deletions too, so
+    # If-Modified-Since alone is enough to detect any add, edit, toggle or delete.
+    with get_conn() as conn:
+        newest, count = conn.execute(SQL_FEED_VERSION, (user_id,)).fetchone()
+        deleted = conn.execute(SQL_FEED_DELETED, (user_id,)).fetchone()
+    changes = [t for t in (newest, deleted[0] if deleted else None) if t]
+    return (max(changes) if changes else None), count
+
+def calendar_feed_url(token: str) -> str:
+    return f"{FILE_SERVER_URL}/calendar/{token}.ics"
+
+# --------------------------- FILE SERVER ---------------------------
+
+def parse_byte_range(header: str | None, size: int):
+    # Returns None for "whole file", (start, end) inclusive for one satisfiable range,
+    # or False when the range cannot be satisfied. Multi-range requests get the whole file.
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return False
+    return start, min(end, size - 1)
+
+def attachment_for_download(note_id: int, user_id: int):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT attachment, attachment_name FROM notes WHERE id=? AND user_id=? AND attachment IS NOT NULL",
+            (note_id, user_id),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("SELECT sha256 FROM attachments WHERE sha256=?", (Path(row[0]).name,))
+        blob = cur.fetchone()
+        return row[0], row[1], blob[0] if blob else None
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    server_version = "StudentAssistance"
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_GET(self, head_only: bool = False):
+        url = urlsplit(self.path)
+        match = re.fullmatch(r"/calendar/([\w-]+)\.ics", url.path)
+        if match:
+            self.send_calendar(match.group(1), head_only)
+            return
+        user_id = verify_download(url.path.strip("/"), parse_qs(url.query))
+        if user_id is None:
+            self.send_error(403, "This download link has expired. Reload the page for a new one.")
+            return
+        match = re.fullmatch(r"/attachments/(\d+)", url.path)
+        if match:
+            row = attachment_for_download(int(match.group(1)), user_id)
+            if row is None:
+                self.send_error(404)
+                return
+            path, name, sha = row
+            name = name or Path(path).name
+            self.send_file(Path(path), name, sha, head_only)
+            return
+        match = re.fullmatch(r"/exports/([0-9a-f]{16})", url.path)
+        if match:
+            out_path, _ = _export_paths(user_id, match.group(1))
+            self.send_file(out_path, "notes_export.pdf", None, head_only)
+            return
+        self.send_error(404)
+
+    def send_file(self, path: Path, filename: str, content_hash: str | None, head_only: bool):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            # Blobs are content-addressed, so their hash is a strong validator; legacy
+            # files fall back to a weak size/mtime tag.
+            etag = f'"{content_hash}"' if content_hash else f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+            if etag in (self.headers.get("If-None-Match") or ""):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            size = stat.st_size
+            byte_range = parse_byte_range(self.headers.get("Range"), size)
+            if byte_range is not None and self.headers.get("If-Range") not in (None, etag):
+                byte_range = None
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            start, end = byte_range or (0, size - 1)
+            self.send_response(206 if byte_range else 200)
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Type", mimetypes.guess_type(filename)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(max(0, end - start + 1)))
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "private, no-cache")
+            self.end_headers()
+            if head_only or end < start:
+                return
+            try:
+                # socket.sendfile uses os.sendfile: the kernel copies file pages to the socket.
+                self.connection.sendfile(f, offset=start, count=end - start + 1)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def send_calendar(self, token: str, head_only: bool):
+        user_id = calendar_feed_user(token)
+        if user_id is None:
+            self.send_error(404)
+            return
+        newest, count = calendar_feed_version(user_id)
+        etag = f'"{hashlib.sha256(f"{newest}|{count}".encode()).hexdigest()[:20]}"'
+        last_modified = None
+        if newest:
+            last_modified = dt.datetime.fromisoformat(newest).replace(microsecond=0, tzinfo=dt.timezone.utc)
+        not_modified = etag in (self.headers.get("If-None-Match") or "")
+        if not not_modified and last_modified and self.headers.get("If-None-Match") is None:
+            try:
+                since = parsedate_to_datetime(self.headers.get("If-Modified-Since", ""))
+                not_modified = since is not None and last_modified <= since
+            except (TypeError, ValueError):
+                pass
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", format_datetime(last_modified, usegmt=True))
+        self.send_header("Cache-Control", "private, no-cache")
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        self.send_header("Content-Disposition", 'inline; filename="reminders.ics"')
+        self.end_headers()
+        if head_only:
+            return
+        # The rows are read before writing anything, so a slow client never holds a pooled
+        # connection (or its read transaction). The body then goes out in ~64 KiB writes;
+        # its length is unknown up front, so the connection close marks its end.
+        with get_conn() as conn:
+            tasks = conn.execute(SQL_LIST_TASKS, (user_id,)).fetchall()
+        buffer, size = [], 0
+        try:
+            for chunk in iter_ics(tasks):
+                buffer.append(chunk)
+                size += len(chunk)
+                if size >= 65536:
+                    self.wfile.write(b"".join(buffer))
+                    buffer, size = [], 0
+            self.wfile.write(b"".join(buffer))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def start_file_server(host: str = FILE_SERVER_HOST, port: int = FILE_SERVER_PORT):
+    server = ThreadingHTTPServer((host, port), FileRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="file-server", daemon=True).start()
+    atexit.register(server.shutdown)
+    return server
+
+@st.cache_resource
+def get_file_server():
+    # One server per process. If the port is already taken, another app process or a
+    # standalone `serve-files` is serving the same database, so links still work.
+    try:
+        return start_file_server()
+    except OSError:
+        return None
+
+def download_url(kind: str, item_id) -> str | None:
+    if not FILE_SERVER_PORT or "user_id" not in st.session_state:
+        return None
+    get_file_server()
+    resource = f"{kind}/{item_id}"
+    return f"{FILE_SERVER_URL}/{resource}?{sign_download(resource, st.session_state.user_id)}"
 
 # --------------------------- UI ---------------------------
 
@@ -350,6 +2414,10 @@ def show_login():
             if uid:
                 st.session_state.user_id = uid
                 st.session_state.username = u.strip().lower()
+                # A cookie lets a refresh or reconnect resume the session; it is written by
+                # sync_session_cookie() on the next run, which st.rerun() does not cut short.
+                st.session_state.session_token = create_session(uid)
+                st.session_state.session_cookie = st.session_state.session_token
                 st.success("Welcome back! ✅")
                 st.rerun()
             else:
@@ -374,8 +2442,12 @@ def sidebar_nav():
         )
         st.divider()
         if st.button("🚪 Logout", use_container_width=True):
-            for k in ["user_id", "username"]:
+            token = st.session_state.get("session_token")
+            if token:
+                revoke_session(token)
+            for k in ["user_id", "username", "session_token"]:
                 st.session_state.pop(k, None)
+            st.session_state.session_cookie = ""
             st.rerun()
     return page
 
@@ -390,42 +2462,89 @@ def page_notes():
             uploaded = st.file_uploader("Attach a file (optional)", type=None)
             submitted = st.form_submit_button("Save note")
         if submitted and title and content:
-            attach_path = None
-            if uploaded is not None:
-                dest = UPLOAD_DIR / f"{secrets.token_hex(8)}_{uploaded.name}"
-                with open(dest, "wb") as f:
-                    f.write(uploaded.getbuffer())
-                attach_path = str(dest)
-            add_note(st.session_state.user_id, title, content, attach_path)
+            staged = stage_upload(uploaded, uploaded.name) if uploaded is not None else None
+            add_note(st.session_state.user_id, title, content, staged)
+            st.session_state.notes_cursors = [None]
             st.success("Saved!")
             st.rerun()
 
-    notes = list_notes(st.session_state.user_id)
-    if not notes:
+    with st.expander("Import notes"):
+        files = st.file_uploader("Text or Markdown files, one note each", type=["txt", "md"],
+                                 accept_multiple_files=True, key="notes_import")
+        if files and st.button("Import notes"):
+            count = add_notes(st.session_state.user_id, (
+                (Path(f.name).stem, f.getvalue().decode("utf-8", "replace")) for f in files
+            ))
+            st.session_state.notes_cursors = [None]
+            st.success(f"Imported {count} notes.")
+
+    query = st.text_input("🔎 Search notes", placeholder="Words or word prefixes")
+    if query.strip():
+        results = search_notes(st.session_state.user_id, query)
+        if not results:
+            st.info("No matching notes.")
+        for nid, title, attachment, attachment_name, created_at, updated_at, snippet in results:
+            render_note(nid, title, attachment, attachment_name, created_at, updated_at, snippet)
+        return
+
+    # Keyset pagination: notes_cursors[i] is the cursor that starts page i.
+    cursors = st.session_state.setdefault("notes_cursors", [None])
+    headers = list_note_headers(st.session_state.user_id, NOTES_PAGE_SIZE + 1, cursors[-1])
+    has_next = len(headers) > NOTES_PAGE_SIZE
+    headers = headers[:NOTES_PAGE_SIZE]
+    if not headers:
+        if len(cursors) > 1:
+            st.session_state.notes_cursors = [None]
+            st.rerun()
         st.info("No notes yet. Create your first above.")
         return
 
-    for nid, title, content, attachment, created_at, updated_at in notes:
-        with st.container():
-            st.markdown(f"**{title}**  ·  _updated {updated_at.split('T')[0]}_")
-            edited = st.text_area("Edit content", value=content, key=f"edit_{nid}")
-            if attachment:
-                st.write(f"Attachment: {Path(attachment).name}")
-                if st.button("Download attachment", key=f"dl_{nid}"):
-                    with open(attachment, "rb") as f:
-                        st.download_button(label="Download", data=f, file_name=Path(attachment).name)
-            col1, col2, col3 = st.columns(3)
-            if col1.button("Update", key=f"upd_{nid}"):
-                update_note(nid, title, edited)
-                st.success("Updated.")
-                st.rerun()
-            if col2.button("Delete", key=f"del_{nid}"):
-                delete_note(nid)
-                st.warning("Deleted.")
-                st.rerun()
-            if col3.button("Export this note to PDF", key=f"pdf_{nid}"):
-                note_pdf = notes_to_pdf([(nid, title, edited, attachment, created_at, updated_at)])
-                st.download_button("Download PDF", data=note_pdf, file_name=f"note_{nid}.pdf")
+    for nid, title, attachment, attachment_name, created_at, updated_at in headers:
+        render_note(nid, title, attachment, attachment_name, created_at, updated_at)
+
+    prev_col, page_col, next_col = st.columns([0.3, 0.4, 0.3])
+    if prev_col.button("← Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    page_col.caption(f"Page {len(cursors)}")
+    if next_col.button("Older →", disabled=not has_next):
+        last = headers[-1]
+        cursors.append((last[5], last[0]))
+        st.rerun()
+
+def render_note(nid, title, attachment, attachment_name, created_at, updated_at, snippet=None):
+    with st.container():
+        st.markdown(f"**{title}**  ·  _updated {updated_at.split('T')[0]}_")
+        if snippet:
+            st.caption(snippet)
+        # The body, editor and attachment widgets are only built for opened notes.
+        if not st.toggle("Open", key=f"open_{nid}"):
+            return
+        content = get_note_content(nid, st.session_state.user_id)
+        if content is None:
+            return
+        edited = st.text_area("Edit content", value=content, key=f"edit_{nid}")
+        display_name = attachment_name or (Path(attachment).name if attachment else None)
+        if attachment:
+            st.write(f"Attachment: {display_name}")
+            url = download_url("attachments", nid)
+            if url:
+                st.link_button("Download attachment", url)
+            elif st.button("Download attachment", key=f"dl_{nid}"):
+                with open(attachment, "rb") as f:
+                    st.download_button(label="Download", data=f, file_name=display_name)
+        col1, col2, col3 = st.columns(3)
+        if col1.button("Update", key=f"upd_{nid}"):
+            update_note(nid, title, edited)
+            st.success("Updated.")
+            st.rerun()
+        if col2.button("Delete", key=f"del_{nid}"):
+            delete_note(nid)
+            st.warning("Deleted.")
+            st.rerun()
+        if col3.button("Export this note to PDF", key=f"pdf_{nid}"):
+            note_pdf = note_to_pdf((nid, title, edited, display_name, created_at, updated_at))
+            st.download_button("Download PDF", data=note_pdf, file_name=f"note_{nid}.pdf")
 
 def page_tasks():
     st.subheader("✅ Tasks & Reminders")
@@ -447,13 +2566,26 @@ def page_tasks():
         st.success("Task added.")
         st.rerun()
 
+    with st.expander("Import tasks from CSV"):
+        st.caption("Columns: task, due_date (ISO, optional), remind_before_hours (optional).")
+        upload = st.file_uploader("CSV file", type=["csv"], key="tasks_csv")
+        if upload is not None and st.button("Import tasks"):
+            reader = csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8-sig"))
+            try:
+                count = add_tasks(st.session_state.user_id, (
+                    (row["task"], row.get("due_date") or None, int(row.get("remind_before_hours") or 0))
+                    for row in reader if row.get("task")
+                ))
+            except (KeyError, ValueError) as exc:
+                st.error(f"Nothing imported: line {reader.line_num}: {exc}")
+            else:
+                st.success(f"Imported {count} tasks.")
+
     tasks = list_tasks(st.session_state.user_id)
     if not tasks:
         st.info("No tasks yet. Add one above.")
         return
 
-    now = dt.datetime.utcnow()
-    upcoming = []
     for tid, task, due_date, remind_before, done, created_at, updated_at in tasks:
         cols = st.columns([0.08, 0.6, 0.18, 0.14])
         with cols[0]:
@@ -469,24 +2601,29 @@ def page_tasks():
         with cols[3]:
             if bool(done) != checked:
                 toggle_task(tid, checked)
-        if due_date:
-            try:
-                dt_obj = dt.datetime.fromisoformat(due_date)
-                remind_time = dt_obj - dt.timedelta(hours=remind_before or 0)
-                if remind_time > now and (remind_time - now) < dt.timedelta(days=7):
-                    upcoming.append((task, dt_obj, remind_time))
-            except Exception:
-                pass
 
+    upcoming = list_upcoming_reminders(st.session_state.user_id)
     if upcoming:
         st.divider()
         st.subheader("🔔 Upcoming reminders (next 7 days)")
-        for task, due_dt, remind_dt in upcoming:
+        for task, due_at, remind_at in upcoming:
+            remind_dt = dt.datetime.fromtimestamp(remind_at)
+            due_dt = dt.datetime.fromtimestamp(due_at)
             st.write(f"**{task}** — remind at {remind_dt.strftime('%Y-%m-%d %H:%M')}, due {due_dt.strftime('%Y-%m-%d %H:%M')}")
         if st.button("Export reminders to calendar (.ics)"):
             ics = tasks_to_ics(tasks)
             st.download_button("Download ICS", data=ics, file_name="reminders.ics")
 
+    if FILE_SERVER_PORT:
+        with st.expander("📅 Subscribe from your calendar app"):
+            st.caption("Calendar apps poll this private link and pick up task changes automatically. "
+                       "Anyone with the link can read your tasks; reset it to revoke the old one.")
+            if st.button("Create a new subscription link"):
+                get_file_server()
+                st.session_state.calendar_feed_token = reset_calendar_feed(st.session_state.user_id)
+            if st.session_state.get("calendar_feed_token"):
+                st.code(calendar_feed_url(st.session_state.calendar_feed_token))
+
 def page_gpa():
     st.subheader("📊 GPA Calculator")
     st.caption("Enter grade points (e.g., 10 for A+) and credits.")
@@ -504,15 +2641,15 @@ def get_timetable(user_id):
     slots = ["9:00–10:00","10:00–11:00","11:00–12:00","2:00–3:00"]
     days = ["Mon","Tue","Wed","Thu","Fri"]
     table = {day: {slot: "" for slot in slots} for day in days}
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT day, slot, subject FROM timetable WHERE user_id=?", (user_id,))
+        cur.execute(SQL_GET_TIMETABLE, (user_id,))
         for day, slot, subject in cur.fetchall():
             table[day][slot] = subject
     return table
 
 def save_timetable(user_id, table):
-    with closing(get_conn()) as conn:
+    with get_conn() as conn:
         cur = conn.cursor()
         for day, slots in table.items():
             for slot, subject in slots.items():
@@ -545,7 +2682,46 @@ def page_timetable():
 
 def page_exports():
     st.subheader("📁 Exports (PDF / ICS)")
-    st.info("Export options are integrated in Notes & Tasks pages.")
+    st.caption("Single notes and reminders can also be exported from the Notes & Tasks pages.")
+    if st.button("Export all notes to PDF"):
+        job_id = submit_notes_export(st.session_state.user_id)
+        st.session_state.setdefault("export_jobs", []).insert(0, job_id)
+    jobs = st.session_state.get("export_jobs", [])
+    if any(export_job_status(st.session_state.user_id, j)[0] not in EXPORT_SETTLED_STATES for j in jobs):
+        export_jobs_live()
+    else:
+        export_jobs_panel()
+
+@st.fragment(run_every=2)
+def export_jobs_live():
+    # Re-runs on its own every couple of seconds so progress updates without a full rerun.
+    # Once every job has finished, one full rerun swaps in the static panel and the timer stops.
+    if not export_jobs_panel():
+        st.rerun()
+
+def export_jobs_panel() -> bool:
+    # Returns whether any job is still queued or running.
+    active = False
+    for job_id in st.session_state.get("export_jobs", []):
+        state, done, total, message = export_job_status(st.session_state.user_id, job_id)
+        if state == "done":
+            st.write(f"✅ Export {job_id}: {total} notes")
+            url = download_url("exports", job_id)
+            if url:
+                st.link_button("Download PDF", url)
+            else:
+                # Read on click, not on every render.
+                out_path, _ = _export_paths(st.session_state.user_id, job_id)
+                st.download_button("Download PDF", data=Path(out_path).read_bytes,
+                                   file_name="notes_export.pdf", mime="application/pdf", key=f"exp_{job_id}")
+        elif state == "error":
+            st.error(f"Export {job_id} failed: {message}")
+        elif state == "expired":
+            st.caption(f"Export {job_id} has expired. Export again if you still need it.")
+        else:
+            active = True
+            st.progress(done / total if total else 0.0, text=f"Export {job_id}: {state} {done}/{total}")
+    return active
 
 def page_flashcards_ui():
     st.subheader("📚 Flashcards")
@@ -556,24 +2732,167 @@ def page_flashcards_ui():
             add_flashcard(st.session_state.user_id, q, a)
             st.success("Flashcard added.")
             st.rerun()
-    flashcards = list_flashcards(st.session_state.user_id)
-    for fid, q, a in flashcards:
-        with st.expander(q):
-            st.write(a)
+    with st.expander("Import flashcards"):
+        upload = st.file_uploader("Deck file", type=["csv", "tsv", "jsonl", "ndjson", "txt"], key="cards_file")
+        fmt = st.selectbox(
+            "Format", list(FLASHCARD_FORMATS), format_func=FLASHCARD_FORMATS.get,
+            index=list(FLASHCARD_FORMATS).index(detect_flashcard_format(upload.name)) if upload else 0,
+        )
+        pasted = st.text_area("…or paste one card per line: question, a tab, then the answer "
+                              "(what copying two spreadsheet columns gives you).", key="cards_paste")
+        if st.button("Import flashcards") and (upload is not None or pasted.strip()):
+            try:
+                if upload is not None:
+                    imported, skipped = import_flashcards(st.session_state.user_id, upload, fmt)
+                else:
+                    imported, skipped = import_flashcards(
+                        st.session_state.user_id, io.BytesIO(pasted.encode()), "tsv")
+            except (ValueError, csv.Error) as exc:
+                st.error(f"Nothing imported: {exc}")
+            else:
+                st.success(f"Imported {imported} flashcards, skipped {skipped} already in your deck.")
+    review_session()
+    with st.expander("Browse recent cards"):
+        for fid, q, a in list_flashcards(st.session_state.user_id, limit=50):
+            st.markdown(f"**{q}**  \n{a}")
+
+def review_session():
+    # The current batch of due cards lives in session state. Each grade is written as soon
+    # as it is given, so closing the tab loses nothing; a lapsed card rejoins the end of
+    # the batch with its new state, so it comes back in the same session.
+    ss = st.session_state
+    st.markdown("#### 🧠 Review")
+    if not ss.get("review_queue"):
+        # An empty batch is never cached, so new or newly due cards show up on the next run.
+        ss.review_queue = due_flashcards(ss.user_id)
+        ss.review_shown = False
+    if not ss.review_queue:
+        upcoming = next_due_at(ss.user_id)
+        if upcoming is None:
+            st.info("No flashcards yet. Add or import some below.")
+        else:
+            when = dt.datetime.fromtimestamp(upcoming).strftime("%Y-%m-%d %H:%M")
+            st.success(f"Nothing due. Next card is due {when}.")
+        return
+    card = ss.review_queue[0]
+    st.caption(f"{len(ss.review_queue)} due in this batch")
+    st.markdown(f"**{card[1]}**")
+    if not ss.review_shown:
+        if st.button("Show answer"):
+            ss.review_shown = True
+            st.rerun()
+    else:
+        st.write(card[2])
+        for col, (label, grade) in zip(st.columns(len(REVIEW_GRADES)), REVIEW_GRADES.items()):
+            if col.button(label, key=f"grade_{label}"):
+                outcome = grade_card(card, grade)
+                record_reviews(ss.user_id, [outcome])
+                ss.review_queue = ss.review_queue[1:]
+                if grade < 3:
+                    _card_id, _grade, ease, interval_days, reps, lapses, _due_at, _now = outcome
+                    ss.review_queue.append((card[0], card[1], card[2], ease, interval_days, reps, lapses))
+                ss.review_shown = False
+                st.rerun()
 
 def page_quizzes_ui():
     st.subheader("📝 Quizzes")
+    if "quiz_run" in st.session_state:
+        quiz_runner()
+        return
+    quiz_results_panel()
+    with st.expander("Generate a quiz from a note"):
+        headers = list_note_headers(st.session_state.user_id, limit=50)
+        if not headers:
+            st.caption("Write some notes first.")
+        else:
+            note = st.selectbox("Note", headers, format_func=lambda header: header[1], key="quiz_gen_note")
+            count = st.slider("Questions", 1, 10, 5, key="quiz_gen_count")
+            if st.button("Generate quiz"):
+                try:
+                    _quiz_id, made = generate_quiz_from_note(st.session_state.user_id, note[0], note[1], count)
+                except ValueError as exc:
+                    st.error(str(exc))
+                else:
+                    st.success(f"Generated {made} questions.")
     with st.form("add_quiz"):
         title = st.text_input("Quiz title")
-        questions = st.text_area("Questions (JSON or simple format)")
+        questions = st.text_area("Questions (JSON or simple format)", help=QUIZ_FORMAT_HELP)
         if st.form_submit_button("Add Quiz"):
-            add_quiz(st.session_state.user_id, title, questions)
-            st.success("Quiz added.")
-            st.rerun()
+            try:
+                add_quiz(st.session_state.user_id, title or "Untitled quiz", questions)
+            except ValueError as exc:
+                st.error(f"Quiz not saved. {exc}")
+            else:
+                st.success("Quiz added.")
+                st.rerun()
     quizzes = list_quizzes(st.session_state.user_id)
-    for qid, title, questions in quizzes:
-        with st.expander(title):
-            st.text(questions)
+    for qid, title, created_at, question_count in quizzes:
+        with st.expander(f"{title} ({question_count} questions)" if question_count else title):
+            if not question_count:
+                # Saved before quizzes were parsed, and not in a format the parser accepts.
+                st.caption("This quiz could not be converted; showing what was saved.")
+                st.text(get_quiz_source(qid, st.session_state.user_id))
+                continue
+            for attempt_id, started_at, finished_at, score, total in list_attempts(st.session_state.user_id, qid):
+                st.caption(f"{finished_at.split('T')[0]}: {score}/{total}")
+            if st.button("Start quiz", key=f"start_quiz_{qid}"):
+                st.session_state.quiz_run = {
+                    "quiz_id": qid, "title": title, "questions": get_quiz_questions(qid),
+                    "answers": [], "started_at": dt.datetime.utcnow().isoformat(),
+                    "shown_at": time.monotonic(), "result": None,
+                }
+                st.rerun()
+
+def quiz_results_panel():
+    last = last_attempt_id(st.session_state.user_id)
+    if last is None:
+        return
+    stats = quiz_analytics(st.session_state.user_id, last)
+    with st.expander("📊 Your results"):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Accuracy", f"{stats['accuracy']:.0%}")
+        col2.metric("Attempts", stats["attempts"])
+        col3.metric("Median time per question", f"{stats['median_seconds']:.1f}s")
+        st.markdown("**By topic** (weakest first)")
+        st.dataframe(stats["topics"], column_config={
+            "accuracy": st.column_config.ProgressColumn("accuracy", min_value=0, max_value=1, format="percent"),
+            "median_seconds": st.column_config.NumberColumn("median s", format="%.1f"),
+            "mean_seconds": st.column_config.NumberColumn("mean s", format="%.1f"),
+        })
+        if len(stats["trend"]) > 1:
+            st.markdown("**Accuracy over attempts**")
+            st.line_chart(stats["trend"].set_index("finished_at")[["accuracy", "rolling_accuracy"]])
+
+def quiz_runner():
+    # One question per run, so time-per-question is measured from when it was shown.
+    run = st.session_state.quiz_run
+    questions = run["questions"]
+    if run["result"] is not None:
+        _attempt_id, score, total = run["result"]
+        st.markdown(f"### {run['title']}: {score}/{total}")
+        for (qid, prompt, topic, choices), (_qid, choice_id, elapsed_ms) in zip(questions, run["answers"]):
+            correct = next(text for _cid, text, is_correct in choices if is_correct)
+            picked = next((text for cid, text, _c in choices if cid == choice_id), None)
+            mark = "✅" if picked == correct else "❌"
+            st.write(f"{mark} **{prompt}** — {correct}" + ("" if picked == correct else f" (you: {picked or 'no answer'})"))
+        if st.button("Back to quizzes"):
+            del st.session_state.quiz_run
+            st.rerun()
+        return
+    index = len(run["answers"])
+    qid, prompt, topic, choices = questions[index]
+    st.caption(f"{run['title']} — question {index + 1} of {len(questions)}" + (f" · {topic}" if topic else ""))
+    picked = st.radio(prompt, choices, index=None, format_func=lambda choice: choice[1], key=f"quiz_q_{qid}")
+    last = index + 1 == len(questions)
+    if st.button("Finish" if last else "Next", disabled=picked is None):
+        run["answers"].append((qid, picked[0], int((time.monotonic() - run["shown_at"]) * 1000)))
+        run["shown_at"] = time.monotonic()
+        if last:
+            run["result"] = submit_attempt(st.session_state.user_id, run["quiz_id"], run["started_at"], run["answers"])
+        st.rerun()
+    if st.button("Abandon quiz"):
+        del st.session_state.quiz_run
+        st.rerun()
 
 def page_goals_ui():
     st.subheader("🎯 Goals & Progress")
@@ -593,14 +2912,70 @@ def page_goals_ui():
             update_goal_progress(gid, new_p)
             st.success("Progress updated.")
             st.rerun()
+        if st.toggle("Show history", key=f"goal_history_{gid}"):
+            goal_history_chart(gid, t)
+
+def goal_history_chart(goal_id: int, target: int):
+    series, projection = goal_history(goal_id, goal_last_event(goal_id), target)
+    if len(series) < 2:
+        st.caption("Not enough history yet. Update your progress to start a trend.")
+        return
+    chart = pd.DataFrame(
+        {"progress": series["progress"].to_numpy()},
+        index=pd.to_datetime(series["ts"], unit="s", utc=True).dt.tz_convert(None),
+    )
+    if projection["eta"] is not None:
+        # A second series: straight from the latest point to the target at the ETA.
+        ends = pd.to_datetime([series["ts"].iloc[-1], projection["eta"]], unit="s", utc=True).tz_convert(None)
+        chart = chart.join(pd.DataFrame({"projection": [series["progress"].iloc[-1], target]}, index=ends), how="outer")
+    st.line_chart(chart)
+    if projection["done"]:
+        st.caption("Goal reached. 🎉")
+    elif projection["eta"] is not None:
+        eta = dt.datetime.fromtimestamp(projection["eta"]).strftime("%Y-%m-%d")
+        st.caption(f"About {projection['per_day']:.2f} per day over the last {analytics.GOAL_VELOCITY_DAYS} days: "
+                   f"on track to finish around {eta}.")
+    else:
+        st.caption("No recent progress, so there is no projected completion date yet.")
 
 # --------------------------- MAIN ---------------------------
 
+def sync_session_cookie():
+    # Writes (or, for "", clears) the login cookie requested by login, logout or a restore.
+    # Only the app's own token is ever interpolated into the script.
+    token = st.session_state.pop("session_cookie", None)
+    if token is None:
+        return
+    max_age = SESSION_TTL_SECONDS if token else 0
+    st.html(
+        f"<script>document.cookie = '{SESSION_COOKIE}={token}; Max-Age={max_age}; Path=/; SameSite=Strict';</script>",
+        unsafe_allow_javascript=True,
+    )
+
+def restore_session():
+    # Links from older versions put the login token in ?session=; drop it from the URL.
+    st.query_params.pop("session", None)
+    token = st.context.cookies.get(SESSION_COOKIE)
+    resolved = resolve_session(token) if isinstance(token, str) and token else None
+    if resolved is None:
+        if token:
+            st.session_state.session_cookie = ""
+        return
+    st.session_state.user_id, st.session_state.username = resolved
+    st.session_state.session_token = token
+    # Re-issue the cookie so its lifetime slides along with the server-side expiry.
+    st.session_state.session_cookie = token
+
 def main():
-    init_db()
+    bootstrap_db()
+    get_reminder_scheduler()
+    if "user_id" not in st.session_state:
+        restore_session()
+    sync_session_cookie()
     if "user_id" not in st.session_state:
         show_login()
         return
+    show_delivered_reminders()
 
     page = sidebar_nav()
 
@@ -621,5 +2996,266 @@ def main():
     elif page == "Goals":
         page_goals_ui()
 
+# --------------------------- COMMAND LINE ---------------------------
+
+def bench_storage(sessions: int, seconds: float, write_ratio: float):
+    schema_dir = Path(tempfile.mkdtemp(prefix="student_bench_"))
+    results = {}
+    for profile in ("legacy", "wal"):
+        db_path = schema_dir / f"{profile}.db"
+        init_db(db_path)
+        pool = ConnectionPool(db_path, size=sessions, profile=profile)
+        now = dt.datetime.utcnow().isoformat()
+        with pool.connection() as conn:
+            conn.executemany(
+                "INSERT INTO notes (user_id, title, content, attachment, created_at, updated_at) VALUES (?,?,?,?,?,?)",
+                [(u % sessions, f"note {u}", "x" * 500, None, now, now) for u in range(sessions * 200)],
+            )
+            conn.commit()
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        counts_lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+
+        def session(uid: int):
+            rnd = secrets.SystemRandom()
+            local = {"reads": 0, "writes": 0, "errors": 0}
+            while time.monotonic() < deadline:
+                try:
+                    with pool.connection() as conn:
+                        if rnd.random() < write_ratio:
+                            ts = dt.datetime.utcnow().isoformat()
+                            conn.execute(
+                                "INSERT INTO notes (user_id, title, content, attachment, created_at, updated_at) VALUES (?,?,?,?,?,?)",
+                                (uid, "bench", "y" * 500, None, ts, ts),
+                            )
+                            conn.commit()
+                            local["writes"] += 1
+                        else:
+                            conn.execute(
+                                "SELECT id, title, content, attachment, created_at, updated_at FROM notes WHERE user_id=? ORDER BY updated_at DESC",
+                                (uid,),
+                            ).fetchall()
+                            local["reads"] += 1
+                except sqlite3.OperationalError:
+                    local["errors"] += 1
+            with counts_lock:
+                for k, v in local.items():
+                    counts[k] += v
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        pool.close()
+        results[profile] = counts
+        print(f"{profile:>7}: {counts['reads'] / seconds:9.0f} reads/s  "
+              f"{counts['writes'] / seconds:9.0f} writes/s  {counts['errors']} lock errors")
+    return results
+
+def bench_search(note_count: int, repeats: int):
+    db_path = Path(tempfile.mkdtemp(prefix="student_bench_")) / "search.db"
+    init_db(db_path)
+    rnd = secrets.SystemRandom()
+    vocab = [secrets.token_hex(rnd.randint(2, 5)) for _ in range(20000)]
+    now = dt.datetime.utcnow().isoformat()
+    start = time.perf_counter()
+    with closing(sqlite3.connect(db_path)) as conn:
+        for low in range(0, note_count, 5000):
+            conn.executemany(
+                "INSERT INTO notes (user_id, title, content, attachment, created_at, updated_at) VALUES (?,?,?,?,?,?)",
+                [(i % 100, " ".join(rnd.choices(vocab, k=4)), " ".join(rnd.choices(vocab, k=150)), None, now, now)
+                 for i in range(low, min(low + 5000, note_count))],
+            )
+            conn.commit()
+    print(f"Indexed {note_count} notes in {time.perf_counter() - start:.1f}s")
+    with closing(sqlite3.connect(db_path)) as conn:
+        for label, make_text in [
+            ("one word", lambda: rnd.choice(vocab)),
+            ("two words", lambda: f"{rnd.choice(vocab)} {rnd.choice(vocab)}"),
+            ("prefix", lambda: rnd.choice(vocab)[:3]),
+        ]:
+            timings = []
+            for _ in range(repeats):
+                query = fts_query(make_text())
+                t0 = time.perf_counter()
+                conn.execute(SQL_SEARCH_NOTES, (query, rnd.randrange(100), NOTES_PAGE_SIZE)).fetchall()
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            print(f"{label:>9}: median {statistics.median(timings):7.2f} ms  "
+                  f"p95 {timings[int(len(timings) * 0.95) - 1]:7.2f} ms")
+
+def bench_bulk(row_count: int):
+    # Runs the app's own write functions against a scratch database, so every pragma
+    # of the configured storage profile (and its fsync cost) is included.
+    global DB_PATH
+    DB_PATH = Path(tempfile.mkdtemp(prefix="student_bench_")) / "bulk.db"
+    init_db(DB_PATH)
+    now = dt.datetime.now()
+    cases = [
+        ("flashcards", lambda i: (f"Question {i}?", f"Answer {i}"),
+         lambda row: add_flashcard(1, *row), lambda rows: add_flashcards(1, rows)),
+        ("tasks", lambda i: (f"Assignment {i}", (now + dt.timedelta(hours=i)).isoformat(timespec="minutes"), 24),
+         lambda row: add_task(1, *row), lambda rows: add_tasks(1, rows)),
+        ("notes", lambda i: (f"Lecture {i}", "Lorem ipsum dolor sit amet. " * 20),
+         lambda row: add_note(1, *row), lambda rows: add_notes(1, rows)),
+    ]
+    for label, make_row, add_one, add_many in cases:
+        rows = [make_row(i) for i in range(row_count)]
+        start = time.perf_counter()
+        for row in rows:
+            add_one(row)
+        single = row_count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        add_many(rows)
+        bulk = row_count / (time.perf_counter() - start)
+        print(f"{label:>10}: single {single:10,.0f} rows/s  bulk {bulk:10,.0f} rows/s  ({bulk / single:.0f}x)")
+
+def bench_analytics(answer_count: int, topics: int = 20, per_attempt: int = 10):
+    db_path = Path(tempfile.mkdtemp(prefix="student_bench_")) / "analytics.db"
+    init_db(db_path)
+    rnd = secrets.SystemRandom()
+    start = time.perf_counter()
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("INSERT INTO quizzes (id, user_id, title, questions, created_at) VALUES (1, 1, 'bench', '', '')")
+        conn.executemany("INSERT INTO quiz_questions (id, quiz_id, position, prompt, topic) VALUES (?,1,?,?,?)",
+                         [(i + 1, i, f"Q{i}", f"Topic {i % topics}") for i in range(per_attempt)])
+        attempts = answer_count // per_attempt
+        base = dt.datetime(2026, 1, 1)
+        conn.executemany(
+            "INSERT INTO quiz_attempts (id, quiz_id, user_id, started_at, finished_at, score, total) VALUES (?,1,1,?,?,0,?)",
+            (((a + 1), (base + dt.timedelta(minutes=a)).isoformat(), (base + dt.timedelta(minutes=a)).isoformat(),
+              per_attempt) for a in range(attempts)),
+        )
+        conn.executemany(
+            "INSERT INTO quiz_answers (attempt_id, question_id, choice_id, is_correct, elapsed_ms) VALUES (?,?,NULL,?,?)",
+            ((a // per_attempt + 1, a % per_attempt + 1, rnd.random() < 0.7, rnd.randint(800, 30000))
+             for a in range(attempts * per_attempt)),
+        )
+        conn.commit()
+        print(f"Generated {attempts * per_attempt:,} answers in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        answers = analytics.load_answers(conn, 1)
+        loaded = time.perf_counter()
+        analytics.topic_accuracy(answers)
+        analytics.attempt_trend(answers)
+        done = time.perf_counter()
+    print(f"Query + load: {loaded - start:.2f}s  aggregate: {(done - loaded) * 1000:.0f} ms  "
+          f"({answers.memory_usage(deep=True).sum() / 1e6:.0f} MB frame)")
+
+def bench_ics(task_count: int):
+    rnd = secrets.SystemRandom()
+    base = dt.datetime(2026, 1, 1, 9, 0)
+    now = dt.datetime.utcnow().isoformat()
+    tasks = [
+        (i, f"Task {i}; read chapter {i}, écrire résumé 📚 " + "x" * rnd.randint(0, 120),
+         (base + dt.timedelta(hours=i)).isoformat(), rnd.choice([0, 1, 24]), i % 7 == 0, now, now)
+        for i in range(task_count)
+    ]
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in iter_ics(tasks))
+    elapsed = time.perf_counter() - start
+    print(f"Generated {task_count} events ({size / 1e6:.1f} MB) in {elapsed * 1000:.0f} ms "
+          f"= {task_count / elapsed:,.0f} events/s")
+
+def cmd_check_plans(db_path: Path) -> int:
+    # Read-only: plans are checked against the schema as it is, never migrated here.
+    if not Path(db_path).exists():
+        print(f"No database at {db_path}; run migrate first.")
+        return 1
+    with closing(connect_readonly(db_path)) as conn:
+        version = _schema_version(conn)
+        if version < SCHEMA_VERSION:
+            print(f"Schema is at version {version}, run migrate (current is {SCHEMA_VERSION}).")
+            return 1
+        problems = check_query_plans(conn)
+    for problem in problems:
+        print(f"SCAN  {problem}")
+    if not problems:
+        print(f"All {len(HOT_QUERIES)} hot queries use an index.")
+    return 1 if problems else 0
+
+def cmd_migrate(db_path: Path, dry_run: bool):
+    steps = migrate(db_path, dry_run=dry_run)
+    verb = "Would apply" if dry_run else "Applied"
+    for version, name in steps:
+        print(f"{verb} {version:04d} {name}")
+    if not steps:
+        print(f"Schema is current (version {SCHEMA_VERSION}).")
+
+def cmd_calibrate_kdf(kdf: str, target_ms: float):
+    params, elapsed = calibrate_kdf(kdf, target_ms)
+    print(f"{kdf} {params} takes {elapsed:.0f} ms per hash (target {target_ms:.0f} ms)")
+    print(f"STUDENT_APP_KDF={kdf}")
+    env_names = {"n": "SCRYPT_N", "r": "SCRYPT_R", "p": "SCRYPT_P", "i": "PBKDF2_ITERATIONS"}
+    for key, value in params.items():
+        print(f"STUDENT_APP_{env_names[key]}={value}")
+
+def cmd_serve_files(host: str, port: int):
+    server = start_file_server(host, port)
+    print(f"Serving downloads on http://{host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Student Assistance maintenance commands.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("bench-storage", help="Compare read/write throughput of storage profiles.")
+    p.add_argument("--sessions", type=int, default=8, help="Concurrent simulated sessions.")
+    p.add_argument("--seconds", type=float, default=5.0, help="Duration per profile.")
+    p.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of operations that write.")
+    p = sub.add_parser("check-plans", help="Fail if a hot list query falls back to a table scan.")
+    p.add_argument("--db", type=Path, default=DB_PATH, help="Database to check.")
+    p = sub.add_parser("migrate", help="Apply pending schema migrations.")
+    p.add_argument("--db", type=Path, default=DB_PATH, help="Database to migrate.")
+    p.add_argument("--dry-run", action="store_true", help="Only list the migrations that would run.")
+    p = sub.add_parser("calibrate-kdf", help="Pick password hashing cost for a target login latency.")
+    p.add_argument("--kdf", choices=sorted(KDF_PARAMS), default=PASSWORD_KDF)
+    p.add_argument("--target-ms", type=float, default=250.0, help="Desired time per password hash.")
+    p = sub.add_parser("rebuild-fts", help="Rebuild the notes full-text index from the notes table.")
+    p.add_argument("--db", type=Path, default=DB_PATH, help="Database to reindex.")
+    p = sub.add_parser("bench-search", help="Measure full-text search latency on a synthetic corpus.")
+    p.add_argument("--notes", type=int, default=100_000, help="Synthetic notes to index.")
+    p.add_argument("--repeats", type=int, default=200, help="Queries per query shape.")
+    p = sub.add_parser("serve-files", help="Run the download server on its own.")
+    p.add_argument("--host", default=FILE_SERVER_HOST)
+    p.add_argument("--port", type=int, default=FILE_SERVER_PORT)
+    p = sub.add_parser("bench-ics", help="Measure ICS generation throughput.")
+    p.add_argument("--tasks", type=int, default=10_000, help="Synthetic tasks to export.")
+    p = sub.add_parser("bench-analytics", help="Time quiz analytics over a synthetic answer history.")
+    p.add_argument("--answers", type=int, default=1_000_000, help="Synthetic answered questions.")
+    p = sub.add_parser("bench-bulk", help="Compare single-row and bulk insert throughput.")
+    p.add_argument("--rows", type=int, default=2000, help="Rows written per table and path.")
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        cmd_migrate(args.db, args.dry_run)
+    elif args.command == "bench-storage":
+        bench_storage(args.sessions, args.seconds, args.write_ratio)
+    elif args.command == "check-plans":
+        sys.exit(cmd_check_plans(args.db))
+    elif args.command == "calibrate-kdf":
+        cmd_calibrate_kdf(args.kdf, args.target_ms)
+    elif args.command == "rebuild-fts":
+        init_db(args.db)
+        rebuild_notes_fts(args.db)
+        print("Notes full-text index rebuilt.")
+    elif args.command == "serve-files":
+        init_db()
+        cmd_serve_files(args.host, args.port)
+    elif args.command == "bench-ics":
+        bench_ics(args.tasks)
+    elif args.command == "bench-analytics":
+        bench_analytics(args.answers)
+    elif args.command == "bench-bulk":
+        bench_bulk(args.rows)
+    elif args.command == "bench-search":
+        bench_search(args.notes, args.repeats)
+
 if __name__ == "__main__":
-    main()
+    if st.runtime.exists():
+        main()
+    else:
+        cli()
@@ -0,0 +1,108 @@
+# analytics.py — quiz and goal analytics for Student Assistance.
+# Every statistic is a SQL aggregate, a pandas groupby or a NumPy fit over one result
+# set, so the work per row happens in vectorised code rather than in a Python loop.
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# One row per answered question. Everything else is derived from this frame.
+SQL_ATTEMPT_ANSWERS = (
+    "SELECT a.id AS attempt_id, a.finished_at, q.topic, ans.is_correct, ans.elapsed_ms "
+    "FROM quiz_attempts a "
+    "JOIN quiz_answers ans ON ans.attempt_id = a.id "
+    "JOIN quiz_questions q ON q.id = ans.question_id "
+    "WHERE a.user_id=?"
+)
+# Attempts averaged together for the smoothed trend line.
+TREND_WINDOW = 5
+
+def load_answers(conn: sqlite3.Connection, user_id: int) -> pd.DataFrame:
+    answers = pd.read_sql_query(
+        SQL_ATTEMPT_ANSWERS, conn, params=(user_id,),
+        dtype={"attempt_id": "int64", "is_correct": "int8", "elapsed_ms": "int64"},
+    )
+    # Few distinct topics across many rows: categoricals keep memory and groupby cheap.
+    answers["topic"] = answers["topic"].fillna("No topic").astype("category")
+    return answers
+
+def topic_accuracy(answers: pd.DataFrame) -> pd.DataFrame:
+    seconds = answers["elapsed_ms"] / 1000
+    return (
+        answers.assign(seconds=seconds)
+        .groupby("topic", observed=True)
+        .agg(answers=("is_correct", "size"), accuracy=("is_correct", "mean"),
+             median_seconds=("seconds", "median"), mean_seconds=("seconds", "mean"))
+        .sort_values("accuracy")
+    )
+
+def attempt_trend(answers: pd.DataFrame) -> pd.DataFrame:
+    trend = (
+        answers.groupby("attempt_id", sort=True)
+        .agg(finished_at=("finished_at", "first"), accuracy=("is_correct", "mean"),
+             seconds_per_question=("elapsed_ms", "mean"))
+    )
+    trend["seconds_per_question"] /= 1000
+    trend["rolling_accuracy"] = trend["accuracy"].rolling(TREND_WINDOW, min_periods=1).mean()
+    trend["finished_at"] = pd.to_datetime(trend["finished_at"], format="ISO8601")
+    return trend
+
+def summarize(conn: sqlite3.Connection, user_id: int) -> dict:
+    answers = load_answers(conn, user_id)
+    if answers.empty:
+        return {"answers": 0}
+    return {
+        "answers": len(answers),
+        "attempts": answers["attempt_id"].nunique(),
+        "accuracy": float(answers["is_correct"].mean()),
+        "median_seconds": float(answers["elapsed_ms"].median()) / 1000,
+        "topics": topic_accuracy(answers),
+        "trend": attempt_trend(answers),
+    }
+
+# Latest event of a goal; its id versions cached series.
+SQL_GOAL_LAST_EVENT = "SELECT id FROM goal_events WHERE goal_id=? ORDER BY ts DESC, id DESC LIMIT 1"
+SQL_GOAL_SPAN = "SELECT MIN(ts), MAX(ts) FROM goal_events WHERE goal_id=?"
+# One row per time bucket. With MAX(id), SQLite takes the bare ts and progress columns
+# from that row, so each bucket reports the last value recorded in it even when several
+# events share a second (ids follow insertion order, as in SQL_GOAL_LAST_EVENT).
+SQL_GOAL_SERIES = (
+    "SELECT MAX(id), ts, progress FROM goal_events WHERE goal_id=? "
+    "GROUP BY (ts - ?) / ? ORDER BY ts"
+)
+# Most points a chart needs; longer histories are bucketed down to this in SQL.
+GOAL_CHART_POINTS = 200
+# Velocity is fitted over the most recent stretch of history only.
+GOAL_VELOCITY_DAYS = 30
+
+def goal_series(conn: sqlite3.Connection, goal_id: int, points: int = GOAL_CHART_POINTS) -> pd.DataFrame:
+    first, last = conn.execute(SQL_GOAL_SPAN, (goal_id,)).fetchone()
+    if first is None:
+        return pd.DataFrame({"ts": np.array([], dtype="int64"), "progress": np.array([], dtype="float64")})
+    bucket = max(1, (last - first) // points + 1)
+    rows = conn.execute(SQL_GOAL_SERIES, (goal_id, first, bucket)).fetchall()
+    series = pd.DataFrame(rows, columns=["id", "ts", "progress"]).drop(columns="id")
+    return series.astype({"ts": "int64", "progress": "float64"})
+
+def project_completion(series: pd.DataFrame, target: float, window_days: int = GOAL_VELOCITY_DAYS) -> dict:
+    # Least-squares line through the recent points; the ETA is where it reaches target.
+    # Time is measured in days back from the latest point, which keeps the fit well
+    # conditioned (raw epoch seconds are huge next to progress values).
+    none = {"done": False, "per_day": None, "eta": None}
+    if series.empty:
+        return none
+    ts, progress = series["ts"].to_numpy(), series["progress"].to_numpy()
+    if progress[-1] >= target:
+        return {"done": True, "per_day": None, "eta": None}
+    days = (ts - ts[-1]) / 86400
+    recent = days >= -window_days
+    if recent.sum() < 2:
+        recent[:] = True
+    if recent.sum() < 2 or np.ptp(days[recent]) == 0:
+        return none
+    per_day, now_value = np.polyfit(days[recent], progress[recent], 1)
+    if per_day <= 0:
+        return {**none, "per_day": float(per_day)}
+    eta = int(ts[-1] + max(0.0, (target - now_value) / per_day) * 86400)
+    return {"done": False, "per_day": float(per_day), "eta": eta}
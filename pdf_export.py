@@ -0,0 +1,283 @@
+# pdf_export.py — PDF rendering for Student Assistance.
+# Kept in its own importable module so export jobs can run in worker processes
+# (the Streamlit script itself cannot be imported by name).
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+# Size of each latin-1 slice written to disk, so a finished document is never
+# duplicated in full as one bytes object.
+WRITE_CHUNK_CHARS = 1024 * 1024
+# How often (in notes) a running job rewrites its progress file.
+PROGRESS_EVERY = 25
+
+# Unicode TrueType fonts (regular, bold). The first existing pair wins; without one,
+# exports fall back to the core Arial font and replace characters it cannot encode.
+FONT_CANDIDATES = [
+    (os.environ.get("STUDENT_APP_PDF_FONT", ""), os.environ.get("STUDENT_APP_PDF_BOLD_FONT", "")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+]
+
+# Parsed TrueType metrics, shared by every export in this process. Parsing a font
+# walks all its tables, so it happens once per process rather than once per PDF.
+_FONT_METRICS: dict[str, dict] = {}
+_FONT_LOCK = threading.Lock()
+
+def _font_metrics(ttf_path: str) -> dict:
+    with _FONT_LOCK:
+        metrics = _FONT_METRICS.get(ttf_path)
+        if metrics is None:
+            ttf = TTFontFile()
+            ttf.getMetrics(ttf_path)
+            metrics = {
+                'name': re.sub('[ ()]', '', ttf.fullName),
+                'desc': {
+                    'Ascent': int(round(ttf.ascent, 0)),
+                    'Descent': int(round(ttf.descent, 0)),
+                    'CapHeight': int(round(ttf.capHeight, 0)),
+                    'Flags': ttf.flags,
+                    'FontBBox': "[%s %s %s %s]" % tuple(int(round(b, 0)) for b in ttf.bbox),
+                    'ItalicAngle': int(ttf.italicAngle),
+                    'StemV': int(round(ttf.stemV, 0)),
+                    'MissingWidth': int(round(ttf.defaultWidth, 0)),
+                },
+                'up': round(ttf.underlinePosition),
+                'ut': round(ttf.underlineThickness),
+                'cw': ttf.charWidths,
+                'originalsize': os.stat(ttf_path).st_size,
+            }
+            _FONT_METRICS[ttf_path] = metrics
+        return metrics
+
+def _unicode_fonts() -> tuple[str, str] | None:
+    for regular, bold in FONT_CANDIDATES:
+        if regular and bold and os.path.exists(regular) and os.path.exists(bold):
+            return regular, bold
+    return None
+
+class NotesPDF(FPDF):
+    """FPDF with cached Unicode fonts and a small Markdown subset for note bodies."""
+
+    def __init__(self):
+        super().__init__()
+        self.set_auto_page_break(auto=True, margin=15)
+        fonts = _unicode_fonts()
+        self.unicode = fonts is not None
+        if self.unicode:
+            self._add_cached_font("body", "", fonts[0])
+            self._add_cached_font("body", "B", fonts[1])
+            self.family_name = "body"
+        else:
+            self.family_name = "Arial"
+
+    def _add_cached_font(self, family: str, style: str, ttf_path: str):
+        # Mirrors FPDF.add_font(..., uni=True) from fpdf 1.7.2 (pinned in requirements.txt),
+        # but reuses the process-wide metrics. The dict layouts below are that version's
+        # private font tables; re-check them before upgrading fpdf.
+        # Only the glyphs actually used are embedded: FPDF subsets TTF fonts on output.
+        metrics = _font_metrics(ttf_path)
+        fontkey = family + style
+        self.fonts[fontkey] = {
+            'i': len(self.fonts) + 1, 'type': 'TTF',
+            'name': metrics['name'], 'desc': metrics['desc'],
+            'up': metrics['up'], 'ut': metrics['ut'], 'cw': metrics['cw'],
+            'ttffile': ttf_path, 'fontkey': fontkey,
+            'subset': list(range(0, 32)), 'unifilename': None,
+        }
+        self.font_files[fontkey] = {'length1': metrics['originalsize'], 'type': "TTF", 'ttffile': ttf_path}
+        self.font_files[ttf_path] = {'type': "TTF"}
+
+    def text(self, value: str) -> str:
+        if self.unicode:
+            return value
+        return value.encode('latin-1', 'replace').decode('latin-1')
+
+    def font(self, size: int, bold: bool = False):
+        self.set_font(self.family_name, 'B' if bold else '', size)
+
+    def paragraph(self, height: float, value: str, indent: float = 0):
+        if indent:
+            # Wrapped lines return to the left margin, so move the margin itself.
+            margin = self.l_margin
+            self.set_left_margin(margin + indent)
+            self.set_x(margin + indent)
+            self.multi_cell(0, height, self.text(value))
+            self.set_left_margin(margin)
+        else:
+            self.multi_cell(0, height, self.text(value))
+
+    def markdown(self, content: str):
+        for line in content.splitlines():
+            stripped = line.strip()
+            heading = re.match(r"(#{1,6})\s+(.*)", stripped)
+            bullet = re.match(r"[-*+]\s+(.*)", stripped)
+            numbered = re.match(r"(\d+[.)])\s+(.*)", stripped)
+            depth = (len(line) - len(line.lstrip())) // 2 * 5
+            if not stripped:
+                self.ln(2)
+            elif heading:
+                self.font({1: 15, 2: 13}.get(len(heading.group(1)), 12), bold=True)
+                self.paragraph(7, _inline(heading.group(2)))
+                self.font(11)
+            elif bullet:
+                marker = "•" if self.unicode else "-"
+                self.paragraph(6, f"{marker} {_inline(bullet.group(1))}", indent=4 + depth)
+            elif numbered:
+                self.paragraph(6, f"{numbered.group(1)} {_inline(numbered.group(2))}", indent=4 + depth)
+            else:
+                self.paragraph(6, _inline(stripped))
+
+def _inline(value: str) -> str:
+    # Emphasis markers are dropped; the PDF keeps one font per line.
+    return re.sub(r"(\*\*|__|`)", "", value)
+
+def _new_pdf() -> NotesPDF:
+    pdf = NotesPDF()
+    pdf.add_page()
+    pdf.font(14)
+    pdf.cell(0, 8, "Notes Export", ln=1)
+    pdf.font(11)
+    return pdf
+
+def _add_note(pdf: NotesPDF, title: str, content: str, attachment: str | None, updated_at: str):
+    pdf.ln(2)
+    pdf.font(12, bold=True)
+    pdf.paragraph(7, f"{title} (updated {updated_at.split('T')[0]})")
+    pdf.font(11)
+    pdf.markdown(content)
+    if attachment:
+        pdf.paragraph(6, f"Attachment: {attachment}")
+    pdf.ln(4)
+
+def notes_to_pdf(notes: list[tuple]) -> bytes:
+    pdf = _new_pdf()
+    for _id, title, content, attachment, created_at, updated_at in notes:
+        _add_note(pdf, title, content, attachment, updated_at)
+    return pdf.output(dest='S').encode('latin-1')
+
+def write_pdf(pdf: NotesPDF, out_path: Path):
+    document = pdf.output(dest='S')
+    with open(out_path, "wb") as out:
+        for start in range(0, len(document), WRITE_CHUNK_CHARS):
+            out.write(document[start:start + WRITE_CHUNK_CHARS].encode('latin-1'))
+
+def write_progress(progress_path: Path, state: str, done: int = 0, total: int = 0, message: str = ""):
+    # Replaced atomically so a reader never sees a half-written status line.
+    tmp = Path(f"{progress_path}.tmp")
+    tmp.write_text(f"{state} {done} {total} {message}".rstrip())
+    os.replace(tmp, progress_path)
+
+def read_progress(progress_path: Path) -> tuple[str, int, int, str]:
+    try:
+        state, done, total, *message = progress_path.read_text().split(" ", 3)
+    except FileNotFoundError:
+        # Every job writes "queued" before it is submitted, so a missing file means the
+        # job is older than the export TTL and was purged.
+        return "expired", 0, 0, ""
+    except (OSError, ValueError):
+        return "queued", 0, 0, ""
+    return state, int(done), int(total), message[0] if message else ""
+
+def export_notes_job(db_path: str, user_id: int, out_path: str, progress_path: str) -> str:
+    # Runs in a worker process: reads notes through its own read-only connection, one
+    # row at a time, and reports progress through progress_path.
+    out_path, progress_path = Path(out_path), Path(progress_path)
+    try:
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM notes WHERE user_id=?", (user_id,)).fetchone()[0]
+            write_progress(progress_path, "running", 0, total)
+            pdf = _new_pdf()
+            rows = conn.execute(
+                "SELECT title, content, COALESCE(attachment_name, attachment), updated_at "
+                "FROM notes WHERE user_id=? ORDER BY updated_at DESC, id DESC",
+                (user_id,),
+            )
+            for done, (title, content, attachment, updated_at) in enumerate(rows, 1):
+                if attachment:
+                    attachment = Path(attachment).name
+                _add_note(pdf, title, content, attachment, updated_at)
+                if done % PROGRESS_EVERY == 0:
+                    write_progress(progress_path, "running", done, total)
+        finally:
+            conn.close()
+        tmp = Path(f"{out_path}.part")
+        write_pdf(pdf, tmp)
+        os.replace(tmp, out_path)
+        write_progress(progress_path, "done", total, total)
+    except Exception as exc:
+        write_progress(progress_path, "error", 0, 0, str(exc) or type(exc).__name__)
+        raise
+    return str(out_path)
+
+# Bump whenever the rendered output changes so cached PDFs from older code are not reused.
+RENDERER_VERSION = "2"
+
+class PdfRenderCache:
+    """Size-bounded on-disk LRU of single-note PDFs."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, note: tuple) -> Path:
+        note_id, title, content, attachment, _created_at, updated_at = note
+        digest = hashlib.sha256(
+            "\0".join([RENDERER_VERSION, updated_at, title, content, attachment or ""]).encode()
+        ).hexdigest()[:32]
+        # The note id prefix lets invalidate() find every render of a note by name alone.
+        return self.root / f"note{note_id}-{digest}.pdf"
+
+    def get(self, note: tuple) -> bytes | None:
+        path = self._path(note)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        # mtime doubles as the LRU clock.
+        os.utime(path)
+        return data
+
+    def put(self, note: tuple, data: bytes):
+        path = self._path(note)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._evict()
+
+    def render(self, note: tuple) -> bytes:
+        data = self.get(note)
+        if data is None:
+            data = notes_to_pdf([note])
+            self.put(note, data)
+        return data
+
+    def invalidate(self, note_id: int):
+        for path in self.root.glob(f"note{note_id}-*.pdf"):
+            path.unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = []
+        for path in self.root.glob("note*.pdf"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
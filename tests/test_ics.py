@@ -0,0 +1,82 @@
+import datetime as dt
+import importlib.util
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+_spec = importlib.util.spec_from_file_location("student_assistance", ROOT / "Student-Assistance.py")
+app = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(app)
+
+UPDATED = "2026-01-01T08:00:00"
+
+
+def parse_ics(data: bytes) -> list[dict]:
+    # Minimal RFC 5545 reader (unfold, split, unescape) used to round-trip check iter_ics.
+    text = data.decode()
+    if "\n" in text.replace("\r\n", ""):
+        raise ValueError("bare LF line ending")
+    lines = text.replace("\r\n ", "").split("\r\n")
+    if lines[-1] != "":
+        raise ValueError("missing final CRLF")
+    events, current = [], None
+    for line in lines[:-1]:
+        name, _, value = line.partition(":")
+        if line == "BEGIN:VEVENT":
+            current = {}
+        elif line == "END:VEVENT":
+            events.append(current)
+            current = None
+        elif current is not None and name not in current:
+            current[name] = re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+    return events
+
+
+def task(tid, title, due_date, remind=0, done=False):
+    return (tid, title, due_date, remind, done, UPDATED, UPDATED)
+
+
+def test_round_trip_preserves_summary_dtstart_and_uid():
+    tasks = [
+        task(1, "Read chapter 3; take notes, then summarise", "2026-03-01T09:30:00", remind=1),
+        task(2, "Écrire le résumé 📚 " + "x" * 200, "2026-03-02T14:00:00"),
+        task(3, "Backslash \\ and\nnewline", "2026-03-03T00:00:00", remind=24),
+    ]
+    events = parse_ics(b"".join(app.iter_ics(tasks)))
+    assert len(events) == len(tasks)
+    for (tid, title, due_date, *_rest), event in zip(tasks, events):
+        assert event["SUMMARY"] == title
+        assert event["DTSTART"] == dt.datetime.fromisoformat(due_date).strftime("%Y%m%dT%H%M%S")
+        assert event["UID"] == f"task-{tid}@student-assist"
+
+
+def test_lines_are_folded_at_75_octets():
+    data = b"".join(app.iter_ics([task(1, "é" * 300, "2026-03-01T09:30:00")]))
+    assert all(len(line) <= 75 for line in data.split(b"\r\n"))
+    assert parse_ics(data)[0]["SUMMARY"] == "é" * 300
+
+
+def test_aware_due_date_is_emitted_in_utc():
+    events = parse_ics(app.tasks_to_ics([task(1, "Call", "2026-03-01T09:30:00+02:00")]))
+    assert events[0]["DTSTART"] == "20260301T073000Z"
+
+
+def test_done_task_has_no_status_or_alarm():
+    data = app.tasks_to_ics([task(1, "Finished", "2026-03-01T09:30:00", remind=1, done=True)])
+    assert b"STATUS:" not in data
+    assert b"BEGIN:VALARM" not in data
+    assert len(parse_ics(data)) == 1
+
+
+def test_tasks_without_a_valid_due_date_are_skipped():
+    data = app.tasks_to_ics([task(1, "No date", None), task(2, "Bad date", "next week")])
+    assert parse_ics(data) == []
+
+
+def test_parse_ics_rejects_bare_line_feeds():
+    with pytest.raises(ValueError):
+        parse_ics(b"BEGIN:VCALENDAR\nEND:VCALENDAR\r\n")